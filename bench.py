@@ -0,0 +1,572 @@
+# The Studio — offline benchmarks
+# Drives the cogs with synthetic gateway events against mock discord objects and a fake HTTP
+# layer. No token, network or MongoDB needed:
+#   python bench.py [--events 5000] [--backend json|mongo|all] [--latency-ms 0] [--json out.json] [--compare base.json]
+
+import argparse
+import asyncio
+import contextlib
+import copy
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from types import SimpleNamespace
+
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DISCORD_TOKEN", "offline.bench.token")
+with contextlib.redirect_stdout(io.StringIO()):
+    import main
+
+import discord
+
+# ---------------- Fake HTTP layer ----------------
+class FakeHTTP:
+    # Every REST call made by a mock object goes through here so scenarios can count them.
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = {}
+
+    async def request(self, route: str):
+        self.calls[route] = self.calls.get(route, 0) + 1
+        await asyncio.sleep(self.latency)
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+# ---------------- Mock discord objects ----------------
+class FakeRole:
+    def __init__(self, guild, rid: int, name: str, permissions: discord.Permissions = None):
+        self.guild = guild
+        self.id = rid
+        self.name = name
+        self.permissions = permissions or discord.Permissions.none()
+        self.mention = f"<@&{rid}>"
+
+    def is_default(self) -> bool:
+        return self.id == self.guild.id
+
+    async def edit(self, permissions=None, reason=None, **_):
+        await self.guild.http.request("role.edit")
+        if permissions is not None:
+            self.permissions = permissions
+
+class FakeChannel:
+    def __init__(self, guild, cid: int, name: str):
+        self.guild = guild
+        self.id = cid
+        self.name = name
+        self.mention = f"<#{cid}>"
+
+    def is_nsfw(self) -> bool:
+        return False
+
+    async def send(self, *args, **kwargs):
+        await self.guild.http.request("channel.send")
+
+    async def set_permissions(self, target, **kwargs):
+        await self.guild.http.request("channel.set_permissions")
+
+    async def delete(self, reason=None):
+        await self.guild.http.request("channel.delete")
+        self.guild.remove_channel(self)
+
+    async def delete_messages(self, messages, reason=None):
+        await self.guild.http.request("channel.bulk_delete" if len(messages) > 1 else "message.delete")
+
+class FakeMember:
+    def __init__(self, guild, uid: int, name: str, roles: list = (), bot: bool = False):
+        self.guild = guild
+        self.id = uid
+        self.name = name
+        self.bot = bot
+        self.roles = [guild.default_role, *roles]
+        self.mention = f"<@{uid}>"
+        self.timed_out_until = None
+        self.display_avatar = SimpleNamespace(url=f"https://cdn.discordapp.com/embed/avatars/{uid % 5}.png")
+        self.avatar = self.display_avatar
+        self.created_at = discord.utils.utcnow() - timedelta(days=400)
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def guild_permissions(self) -> discord.Permissions:
+        value = 0
+        for r in self.roles:
+            value |= r.permissions.value
+        return discord.Permissions(value)
+
+    async def edit(self, roles=None, timed_out_until=discord.utils.MISSING, reason=None, **_):
+        await self.guild.http.request("member.edit")
+        if roles is not None:
+            self.roles = [self.guild.default_role, *[r for r in roles if not r.is_default()]]
+        if timed_out_until is not discord.utils.MISSING:
+            self.timed_out_until = timed_out_until
+
+    async def timeout(self, until, reason=None):
+        await self.edit(timed_out_until=until, reason=reason)
+
+    async def kick(self, reason=None):
+        await self.guild.http.request("member.kick")
+
+    async def ban(self, reason=None, **_):
+        await self.guild.http.request("guild.ban")
+
+    async def add_roles(self, *roles, reason=None):
+        await self.guild.http.request("member.add_role")
+        self.roles.extend(r for r in roles if r not in self.roles)
+
+    async def remove_roles(self, *roles, reason=None):
+        await self.guild.http.request("member.remove_role")
+        self.roles = [r for r in self.roles if r not in roles]
+
+    async def create_dm(self):
+        return FakeChannel(self.guild, self.id, f"dm-{self.id}")
+
+class FakeGuild:
+    _entry_seq = iter(range(10**18))
+    def __init__(self, gid: int, http: FakeHTTP, members: int = 50, channels: int = 20):
+        self.id = gid
+        self.name = f"guild-{gid}"
+        self.shard_id = 0
+        self.http = http
+        self.member_count = members
+        self.audit_entries = []
+        self.default_role = FakeRole(self, gid, "@everyone")
+        self.mod_role = FakeRole(self, gid + 1, "Mod", discord.Permissions(manage_roles=True, kick_members=True))
+        self.member_role = FakeRole(self, gid + 2, "Member")
+        self._roles = {r.id: r for r in (self.default_role, self.mod_role, self.member_role)}
+        self.text_channels = [FakeChannel(self, gid + 100 + i, "mod-log" if i == 0 else f"chat-{i}") for i in range(channels)]
+        self._channels = {c.id: c for c in self.text_channels}
+        self._members = {}
+        for i in range(members):
+            uid = gid * 1000 + i
+            self._members[uid] = FakeMember(self, uid, f"user{i}", [self.mod_role] if i < 3 else [self.member_role])
+
+    @property
+    def members(self) -> list:
+        return list(self._members.values())
+
+    @property
+    def roles(self) -> list:
+        return list(self._roles.values())
+
+    def get_member(self, uid):
+        return self._members.get(uid)
+
+    def get_role(self, rid):
+        return self._roles.get(rid)
+
+    def get_channel(self, cid):
+        return self._channels.get(cid)
+
+    get_channel_or_thread = get_channel
+
+    def remove_channel(self, channel):
+        self._channels.pop(channel.id, None)
+        if channel in self.text_channels:
+            self.text_channels.remove(channel)
+
+    async def audit_logs(self, limit: int = 100, action=None):
+        await self.http.request("guild.audit_logs")
+        for entry in reversed(self.audit_entries[-limit:]):
+            if action is None or entry.action == action:
+                yield entry
+
+    async def create_role(self, name: str, reason=None, **_):
+        await self.http.request("guild.create_role")
+        role = FakeRole(self, self.id + 10 + len(self._roles), name)
+        self._roles[role.id] = role
+        return role
+
+    async def create_text_channel(self, name: str, reason=None, **_):
+        await self.http.request("guild.create_channel")
+        ch = FakeChannel(self, self.id + 100 + len(self._channels) + 1000, name)
+        self._channels[ch.id] = ch
+        self.text_channels.append(ch)
+        return ch
+
+    async def unban(self, user, reason=None):
+        await self.http.request("guild.unban")
+
+    async def bulk_ban(self, users, reason=None, delete_message_seconds: int = 86400):
+        await self.http.request("guild.bulk_ban")
+        users = list(users)
+        for u in users:
+            self._members.pop(u.id, None)
+        return SimpleNamespace(banned=users, failed=[])
+
+    def log_action(self, action, target, user_id: int):
+        # Real entry ids are snowflakes minted when the action happens.
+        entry_id = discord.utils.time_snowflake(discord.utils.utcnow()) + next(self._entry_seq) % (1 << 22)
+        entry = SimpleNamespace(id=entry_id, guild=self, action=action, target=target, user_id=user_id)
+        self.audit_entries.append(entry)
+        return entry
+
+class FakeMessage:
+    _ids = iter(range(10**12, 10**13))
+
+    def __init__(self, author: FakeMember, channel: FakeChannel, content: str, attachments: list = (), mentions: list = ()):
+        self.id = next(self._ids)
+        self.guild = author.guild
+        self.author = author
+        self.channel = channel
+        self.content = content
+        self.attachments = list(attachments)
+        self.mentions = list(mentions)
+
+    async def delete(self):
+        await self.guild.http.request("message.delete")
+
+class FakeContext:
+    def __init__(self, guild: FakeGuild, author: FakeMember, channel: FakeChannel):
+        self.guild = guild
+        self.author = author
+        self.channel = channel
+
+    async def reply(self, *args, **kwargs):
+        await self.guild.http.request("channel.send")
+
+# ---------------- Mongo stand-in ----------------
+def _match(doc: dict, query: dict) -> bool:
+    for k, cond in query.items():
+        v = doc.get(k)
+        if isinstance(cond, dict):
+            for op, ref in cond.items():
+                if v is None or not {"$gte": v >= ref, "$lte": v <= ref, "$lt": v < ref, "$gt": v > ref}[op]:
+                    return False
+        elif v != cond:
+            return False
+    return True
+
+def _project(doc: dict, projection: dict) -> dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    if any(v for k, v in projection.items() if k != "_id"):
+        return {k: copy.deepcopy(doc[k]) for k, v in projection.items() if v and k in doc}
+    return {k: copy.deepcopy(v) for k, v in doc.items() if projection.get(k, 1)}
+
+class FakeCursor:
+    def __init__(self, docs: list, projection: dict = None):
+        self.docs = docs
+        self.projection = projection
+
+    def sort(self, key: str, direction: int = 1):
+        self.docs = sorted(self.docs, key=lambda d: d.get(key, 0), reverse=direction < 0)
+        return self
+
+    def skip(self, n: int):
+        self.docs = self.docs[n:]
+        return self
+
+    def limit(self, n: int):
+        self.docs = self.docs[:n] if n else self.docs
+        return self
+
+    async def to_list(self, n=None):
+        return [_project(d, self.projection) for d in (self.docs[:n] if n else self.docs)]
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for d in self.docs:
+            yield _project(d, self.projection)
+
+class FakeCollection:
+    # In-memory collection with a per-gid bucket standing in for the real (gid, ...) indexes.
+    # Results are deep-copied, like documents decoded off the wire.
+    def __init__(self):
+        self.by_gid = {}
+        self.ops = 0
+        self.next_id = 0
+
+    def _scan(self, query: dict) -> list:
+        self.ops += 1
+        if "gid" in query:
+            pool = self.by_gid.get(query["gid"], [])
+        else:
+            pool = [d for docs in self.by_gid.values() for d in docs]
+        return [d for d in pool if _match(d, query)]
+
+    async def create_index(self, *args, **kwargs):
+        return None
+
+    async def find_one(self, query: dict):
+        found = self._scan(query)
+        return copy.deepcopy(found[0]) if found else None
+
+    def find(self, query: dict = None, projection: dict = None) -> FakeCursor:
+        return FakeCursor(self._scan(query or {}), projection)
+
+    async def insert_one(self, doc: dict):
+        self.ops += 1
+        self.next_id += 1
+        self.by_gid.setdefault(doc.get("gid"), []).append({"_id": self.next_id, **copy.deepcopy(doc)})
+
+    async def insert_many(self, docs: list, ordered: bool = True):
+        for doc in docs:
+            await self.insert_one(doc)
+
+    async def count_documents(self, query: dict) -> int:
+        return len(self._scan(query))
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        found = self._scan(query)
+        doc = found[0] if found else None
+        if doc is None:
+            if not upsert:
+                return
+            doc = dict(query)
+            self.by_gid.setdefault(doc.get("gid"), []).append(doc)
+        for path, value in update.get("$set", {}).items():
+            *parents, leaf = path.split(".")
+            node = doc
+            for p in parents:
+                node = node.setdefault(p, {})
+            node[leaf] = copy.deepcopy(value)
+
+    async def replace_one(self, query: dict, doc: dict, upsert: bool = False):
+        await self.delete_one(query)
+        await self.insert_one(doc)
+
+    async def delete_one(self, query: dict):
+        for d in self._scan(query):
+            self.by_gid[d.get("gid")].remove(d)
+            return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    async def delete_many(self, query: dict):
+        found = self._scan(query)
+        for d in found:
+            self.by_gid[d.get("gid")].remove(d)
+        return SimpleNamespace(deleted_count=len(found))
+
+class FakeMotorDB:
+    def __init__(self):
+        self.collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self.collections.setdefault(name, FakeCollection())
+
+# ---------------- Harness ----------------
+def make_backend(kind: str, workdir: str) -> main.AbstractDB:
+    if kind == "mongo":
+        db = main.MongoDB("mongodb://bench", "bench")
+        db.db = FakeMotorDB()
+        db.init = lambda: asyncio.sleep(0)
+        return main.instrument_db(db)
+    return main.instrument_db(main.JSONDB(os.path.join(workdir, "bench.json"), commit_interval=main.COMMIT_INTERVAL))
+
+async def fresh_bot(kind: str, workdir: str) -> main.TheStudio:
+    # Reuses the module-level bot object but resets every piece of per-run state.
+    bot = main.bot
+    bot.init_state(make_backend(kind, workdir))
+    await bot.db.init()
+    return bot
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+async def measure(name: str, make_events, run_event, n: int, http: FakeHTTP) -> dict:
+    events = make_events(n)
+    calls0 = http.total
+    lat = []
+    t0 = time.perf_counter()
+    for ev in events:
+        s = time.perf_counter()
+        await run_event(ev)
+        lat.append(time.perf_counter() - s)
+    elapsed = time.perf_counter() - t0
+    calls = http.total - calls0
+    # Memory is sampled on a shorter second pass: tracemalloc would distort the timings.
+    sample = make_events(max(100, n // 10))
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for ev in sample:
+        await run_event(ev)
+    cur, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    lat.sort()
+    return {"scenario": name, "events": n, "events_per_sec": n / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(lat, 0.50) * 1000, "p99_ms": percentile(lat, 0.99) * 1000,
+            "retained_bytes_per_event": max(0, cur - base) / len(sample), "peak_kib": (peak - base) / 1024,
+            "http_calls": calls}
+
+async def run_backend(kind: str, n: int, latency: float, seed: int) -> list:
+    rng = random.Random(seed)
+    http = FakeHTTP(latency)
+    with tempfile.TemporaryDirectory() as workdir:
+        bot = await fresh_bot(kind, workdir)
+        antinuke, warns, moderation = main.AntiNuke(bot), main.Warns(bot), main.Moderation(bot)
+        guilds = [FakeGuild(10**6 * (i + 1), http) for i in range(20)]
+        pick = lambda g: rng.choice(g.members[3:])
+        image = SimpleNamespace(content_type="image/png")
+
+        def chat(count):
+            out = []
+            for _ in range(count):
+                g = rng.choice(guilds)
+                out.append(FakeMessage(pick(g), rng.choice(g.text_channels[1:]), rng.choice(("hello", "gg", "anyone up?", "lol that was wild"))))
+            return out
+
+        def mixed(count):
+            # Mostly chat, some invite links and images, and short spam bursts from a few users.
+            out = []
+            for _ in range(count):
+                g = rng.choice(guilds)
+                roll = rng.random()
+                if roll < 0.02:
+                    out.append(FakeMessage(pick(g), g.text_channels[1], "join discord.gg/abcdef"))
+                elif roll < 0.03:
+                    out.append(FakeMessage(pick(g), g.text_channels[1], "", attachments=[image]))
+                elif roll < 0.08:
+                    m = g.members[-1 - rng.randrange(3)]
+                    out.extend(FakeMessage(m, g.text_channels[1], "spam") for _ in range(3))
+                else:
+                    out.append(FakeMessage(pick(g), rng.choice(g.text_channels[1:]), "hello there"))
+            return out[:count]
+
+        def duplicates(count):
+            # Chat where one payload gets pasted across channels by several accounts at once.
+            out = []
+            while len(out) < count:
+                g = rng.choice(guilds)
+                if rng.random() < 0.05:
+                    payload = f"free nitro giveaway claim now at nitro-{rng.randrange(10**6)}.gift"
+                    out.extend(FakeMessage(pick(g), rng.choice(g.text_channels[1:]), payload) for _ in range(8))
+                else:
+                    out.append(FakeMessage(pick(g), rng.choice(g.text_channels[1:]), rng.choice(("hello there", "anyone up?", "lol that was wild"))))
+            return out[:count]
+
+        def channel_deletes(count):
+            out = []
+            for i in range(count):
+                g = rng.choice(guilds)
+                ch = FakeChannel(g, 5 * 10**9 + i, f"doomed-{i}")
+                actor = g.members[rng.randrange(3)]
+                out.append((g, ch, actor))
+            return out
+
+        async def run_channel_delete(ev):
+            g, ch, actor = ev
+            await antinuke.on_audit_log_entry_create(g.log_action(discord.AuditLogAction.channel_delete, ch, actor.id))
+            await antinuke.on_guild_channel_delete(ch)
+
+        def role_updates(count):
+            out = []
+            for _ in range(count):
+                g = rng.choice(guilds)
+                actor = g.members[rng.randrange(3)]
+                before = FakeRole(g, g.member_role.id, "Member")
+                after = FakeRole(g, g.member_role.id, "Member", discord.Permissions(administrator=True))
+                out.append((g, before, after, actor))
+            return out
+
+        async def run_role_update(ev):
+            g, before, after, actor = ev
+            await antinuke.on_audit_log_entry_create(g.log_action(discord.AuditLogAction.role_update, after, actor.id))
+            await antinuke.on_guild_role_update(before, after)
+
+        def commands_for(count):
+            out = []
+            for _ in range(count):
+                g = rng.choice(guilds)
+                out.append((FakeContext(g, g.members[0], g.text_channels[1]), pick(g)))
+            return out
+
+        async def run_warn(ev):
+            ctx, member = ev
+            await warns.warn.callback(warns, ctx, member, reason="bench")
+
+        def joins(count):
+            # Steady trickle of aged accounts, with waves of fresh, avatarless, similarly named ones.
+            out = []
+            for i in range(count):
+                g = rng.choice(guilds)
+                uid = g.id * 1000 + 10**5 + i
+                if rng.random() < 0.3:
+                    m = FakeMember(g, uid, f"raider_{rng.randrange(10**4)}")
+                    m.created_at = discord.utils.utcnow() - timedelta(hours=rng.uniform(1, 48))
+                    m.avatar = None
+                else:
+                    m = FakeMember(g, uid, f"{rng.choice(('alex', 'sam', 'kai', 'mo'))}{rng.randrange(100)}")
+                out.append(m)
+            return out
+
+        async def run_timeout(ev):
+            ctx, member = ev
+            await moderation.timeout_cmd.callback(moderation, ctx, member, "5m", reason="bench")
+
+        results = [
+            await measure("global on_message (chat)", chat, main.on_message, n, http),
+            await measure("AntiNuke.on_message (mixed)", mixed, antinuke.on_message, n, http),
+            await measure("AntiNuke.on_message (dupes)", duplicates, antinuke.on_message, n, http),
+            await measure("AntiNuke channel delete", channel_deletes, run_channel_delete, max(100, n // 10), http),
+            await measure("AntiNuke role update", role_updates, run_role_update, max(100, n // 10), http),
+            await measure("AntiNuke member join (waves)", joins, antinuke.on_member_join, n, http),
+            await measure("Warns.warn", commands_for, run_warn, max(100, n // 5), http),
+            await measure("Moderation.timeout", commands_for, run_timeout, max(100, n // 5), http),
+        ]
+        await bot.modlog.drain()
+        t0 = time.perf_counter()
+        await bot.db.flush()
+        results.append({"scenario": "final flush", "events": 1, "events_per_sec": 0.0, "p50_ms": (time.perf_counter() - t0) * 1000,
+                        "p99_ms": (time.perf_counter() - t0) * 1000, "retained_bytes_per_event": 0.0, "peak_kib": 0.0, "http_calls": 0})
+        for r in results:
+            r["backend"] = kind
+        return results
+
+def print_table(results: list, baseline: dict = None):
+    head = f"{'backend':<7} {'scenario':<30} {'events':>7} {'ev/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'B/ev':>8} {'peak KiB':>9} {'http':>6}"
+    print(head)
+    print("-" * len(head))
+    for r in results:
+        line = (f"{r['backend']:<7} {r['scenario']:<30} {r['events']:>7} {r['events_per_sec']:>10.0f} {r['p50_ms']:>8.3f} "
+                f"{r['p99_ms']:>8.3f} {r['retained_bytes_per_event']:>8.0f} {r['peak_kib']:>9.1f} {r['http_calls']:>6}")
+        base = (baseline or {}).get((r["backend"], r["scenario"]))
+        if base and base["events_per_sec"]:
+            line += f"   ev/s {100 * (r['events_per_sec'] / base['events_per_sec'] - 1):+.1f}%"
+        if base and base["p99_ms"]:
+            line += f"  p99 {100 * (r['p99_ms'] / base['p99_ms'] - 1):+.1f}%"
+        print(line)
+
+async def run(args) -> list:
+    backends = ["json", "mongo"] if args.backend == "all" else [args.backend]
+    results = []
+    for kind in backends:
+        results.extend(await run_backend(kind, args.events, args.latency_ms / 1000, args.seed))
+    return results
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline benchmarks for The Studio cogs.")
+    p.add_argument("--events", type=int, default=5000, help="messages per on_message scenario")
+    p.add_argument("--backend", choices=("json", "mongo", "all"), default="all")
+    p.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency per fake REST call")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", help="write results to this file")
+    p.add_argument("--compare", help="baseline results file from a previous --json run")
+    return p.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    main.log.setLevel("WARNING")
+    results = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {(r["backend"], r["scenario"]): r for r in json.load(f)}
+    print_table(results, baseline)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
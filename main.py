@@ -3,12 +3,23 @@
 # Install deps: pip install -r requirements.txt
 
 import asyncio
+import bisect
+import cProfile
+import heapq
+import io
 import json
 import logging
 import os
+import pstats
 import random
 import re
+import shutil
+import sqlite3
 import sys
+import threading
+import time
+from functools import partial, wraps
+from collections import OrderedDict, deque
 from typing import Optional
 from datetime import datetime, timedelta, timezone
 
@@ -115,6 +126,33 @@ DB_MODE = CONFIG.get("database", {}).get("mode", "json")
 JSON_PATH = CONFIG.get("database", {}).get("json_path", "data.json")
 MONGO_URI = CONFIG.get("database", {}).get("mongo_uri", "mongodb://localhost:27017")
 MONGO_DB_NAME = CONFIG.get("database", {}).get("mongo_db", "modbot")
+SQLITE_PATH = CONFIG.get("database", {}).get("sqlite_path", "data.db")
+COMMIT_INTERVAL = int(CONFIG.get("database", {}).get("commit_interval_ms", 500)) / 1000
+JOURNAL_FSYNC_EVERY = int(CONFIG.get("database", {}).get("journal_fsync_every", 50))
+JOURNAL_COMPACT_EVERY = int(CONFIG.get("database", {}).get("journal_compact_every", 1000))
+AUDIT_MAX_ENTRIES = int(CONFIG.get("audit", {}).get("max_entries", 5000))
+AUDIT_MAX_AGE_DAYS = float(CONFIG.get("audit", {}).get("max_age_days", 30))
+AUDIT_SEGMENT_SIZE = int(CONFIG.get("audit", {}).get("segment_size", 500))
+AUDIT_PRUNE_EVERY = 100
+SNIPE_MAX = int(CONFIG.get("caches", {}).get("snipe_max", 5000))
+SNIPE_MAX_AGE = float(CONFIG.get("caches", {}).get("snipe_max_age", 3600))
+AFK_MAX = int(CONFIG.get("caches", {}).get("afk_max", 10000))
+AFK_MAX_AGE = float(CONFIG.get("caches", {}).get("afk_max_age", 7*86400))
+CACHE_TTL = float(CONFIG.get("database", {}).get("cache_ttl", 300))
+CACHE_SIZE = int(CONFIG.get("database", {}).get("cache_size", 10000))
+
+METRICS_CONFIG = CONFIG.get("metrics", {})
+METRICS_ENABLED = bool(METRICS_CONFIG.get("enabled", False))
+METRICS_HOST = METRICS_CONFIG.get("host", "127.0.0.1")
+METRICS_PORT = int(METRICS_CONFIG.get("port", 9108))
+
+SHARDING = CONFIG.get("sharding", {})
+CLUSTER_SOCKET = os.getenv("STUDIO_CLUSTER_SOCKET") or CONFIG.get("cluster", {}).get("socket", "thestudio.sock")
+CLUSTER_ID = os.getenv("STUDIO_CLUSTER_ID")
+# Cluster workers get their shard range from the launcher through the environment.
+SHARDING_ENABLED = bool(SHARDING.get("enabled", False)) or CLUSTER_ID is not None
+SHARD_COUNT = os.getenv("STUDIO_SHARD_COUNT") or SHARDING.get("shard_count")
+SHARD_IDS = [int(i) for i in os.getenv("STUDIO_SHARD_IDS").split(",")] if os.getenv("STUDIO_SHARD_IDS") else SHARDING.get("shard_ids")
 
 # ---------------- Intents ----------------
 intents = discord.Intents(
@@ -171,11 +209,1294 @@ def ok_embed(title=None, description=None, requester: Optional[discord.abc.User]
             e.set_thumbnail(url=url)
     footer_text = f"{EMBED_FOOTER} • {MADE_BY} • {GITHUB_URL}"
     footer_icon = avatar_url(requester) if requester else None
-    e.set_footer(text=footer_text if requester is None else f"Requested by {requester} • {MADE_BY}", icon_url=footer_icon if footer_icon else discord.Embed.Empty)
+    e.set_footer(text=footer_text if requester is None else f"Requested by {requester} • {MADE_BY}", icon_url=footer_icon)
     e.timestamp = datetime.now(timezone.utc)
     return e
 
+# ---------------- Metrics ----------------
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+
+    def inc(self, n: float = 1, **labels):
+        key = tuple(labels.get(l, "") for l in self.labels)
+        self.values[key] = self.values.get(key, 0) + n
+
+    def render(self) -> list:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, v in self.values.items():
+            out.append(f"{self.name}{metric_labels(self.labels, key)} {v}")
+        return out
+
+class Histogram:
+    BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, seconds: float, **labels):
+        key = tuple(labels.get(l, "") for l in self.labels)
+        row = self.values.get(key)
+        if row is None:
+            row = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        row[bisect.bisect_left(self.buckets, seconds)] += 1
+        row[-1] += seconds
+
+    def render(self) -> list:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, row in self.values.items():
+            total = 0
+            for le, n in zip(self.buckets + ("+Inf",), row):
+                total += n
+                out.append(f"{self.name}_bucket{metric_labels(self.labels + ('le',), key + (le,))} {total}")
+            out.append(f"{self.name}_sum{metric_labels(self.labels, key)} {row[-1]}")
+            out.append(f"{self.name}_count{metric_labels(self.labels, key)} {total}")
+        return out
+
+class Gauge:
+    # Sampled at scrape time: fn returns {label values tuple: value}.
+    def __init__(self, name: str, help: str, fn, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = labels
+
+    def render(self) -> list:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, v in self.fn().items():
+            out.append(f"{self.name}{metric_labels(self.labels, key)} {v}")
+        return out
+
+def metric_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values)) + "}"
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        m = Counter(name, help, labels)
+        self.metrics.append(m)
+        return m
+
+    def histogram(self, name: str, help: str, labels: tuple = ()) -> Histogram:
+        m = Histogram(name, help, labels)
+        self.metrics.append(m)
+        return m
+
+    def gauge(self, name: str, help: str, fn, labels: tuple = ()) -> Gauge:
+        m = Gauge(name, help, fn, labels)
+        self.metrics.append(m)
+        return m
+
+    def render(self) -> str:
+        return "\n".join(line for m in self.metrics for line in m.render()) + "\n"
+
+METRICS = MetricsRegistry()
+ANTINUKE_MESSAGE_SECONDS = METRICS.histogram("studio_antinuke_on_message_seconds", "AntiNuke.on_message handling time")
+DB_CALL_SECONDS = METRICS.histogram("studio_db_call_seconds", "Database backend call latency", ("method",))
+PUNISH_SECONDS = METRICS.histogram("studio_punish_seconds", "Time from Anti-Nuke trigger to punishment applied")
+COMMAND_SECONDS = METRICS.histogram("studio_command_seconds", "Command execution time", ("command", "kind"))
+FILTER_HITS = METRICS.counter("studio_filter_hits_total", "Message filter actions", ("filter",))
+
+class MetricsServer:
+    # Minimal HTTP endpoint for Prometheus scrapes; serves the registry on every GET.
+    def __init__(self, registry: MetricsRegistry, host: str, port: int):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        log.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(reader.readline(), 5)
+            while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+                pass
+            if request.startswith(b"GET /metrics") or request.startswith(b"GET / "):
+                status, body = "200 OK", self.registry.render().encode()
+            else:
+                status, body = "404 Not Found", b"not found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+# ---------------- Profiling ----------------
+class ProfileSession:
+    # cProfile capture either for a fixed number of seconds (target=None) or around the next
+    # `remaining` invocations of a command/listener. The profiler is thread-wide, so other
+    # coroutines that run while a targeted invocation is suspended are captured too.
+    def __init__(self, target: Optional[str], remaining: int = 0):
+        self.target = target
+        self.remaining = remaining
+        self.calls = 0
+        self.profile = cProfile.Profile()
+        self.done = asyncio.get_running_loop().create_future()
+        self.started = time.perf_counter()
+        self._depth = 0
+        if target is None:
+            self.profile.enable()
+
+    def matches(self, name: str) -> bool:
+        return not self.done.done() and self.target is not None and name == self.target and self.calls < self.remaining
+
+    def enter(self):
+        self.calls += 1
+        self._depth += 1
+        if self._depth == 1:
+            self.profile.enable()
+
+    def exit(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self.profile.disable()
+            if self.calls >= self.remaining:
+                self.finish()
+
+    def attach(self, bot: commands.Bot):
+        # Listener capture swaps the target's handlers for wrapped ones through the public
+        # add_listener/event API; detach() puts the originals back.
+        self._swapped = []
+        for func in list(bot.extra_events.get(self.target, ())):
+            bot.remove_listener(func, self.target)
+            bot.add_listener(self._wrap(func), self.target)
+            self._swapped.append(func)
+        self._handler = bot.__dict__.get(self.target)
+        if self._handler is not None:
+            bot.event(self._wrap(self._handler))
+
+    def detach(self, bot: commands.Bot):
+        for func in list(bot.extra_events.get(self.target, ())):
+            if getattr(func, "__wrapped__", None) in self._swapped:
+                bot.remove_listener(func, self.target)
+                bot.add_listener(func.__wrapped__, self.target)
+        if self._handler is not None:
+            bot.event(self._handler)
+
+    def _wrap(self, func):
+        @wraps(func)
+        async def wrapped(*args, **kwargs):
+            if not self.matches(self.target):
+                return await func(*args, **kwargs)
+            self.enter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.exit()
+        return wrapped
+
+    def finish(self):
+        if self.target is None or self._depth:
+            self.profile.disable()
+            self._depth = 0
+        if not self.done.done():
+            self.done.set_result(None)
+
+    def report(self, sort: str = "cumulative") -> bytes:
+        out = io.StringIO()
+        label = f"{self.calls} invocation(s) of {self.target}" if self.target else f"{time.perf_counter() - self.started:.1f}s"
+        out.write(f"The Studio profile — {label}\n\n")
+        try:
+            pstats.Stats(self.profile, stream=out).sort_stats(sort).print_stats()
+        except TypeError:
+            out.write("No samples were collected.\n")
+        return out.getvalue().encode()
+
+# ---------------- Rate counters ----------------
+class SlidingWindowCounter:
+    # Per-key deques of monotonic timestamps; expiry happens lazily on the key being hit,
+    # so insert + expire is amortized O(1) and idle keys are dropped by sweep().
+    __slots__ = ("_hits",)
+
+    def __init__(self):
+        self._hits = {}
+
+    def hit(self, key, window: float, cap: Optional[int]=None, now: Optional[float]=None) -> int:
+        now = time.monotonic() if now is None else now
+        dq = self._hits.get(key)
+        if dq is None or dq.maxlen != cap:
+            # A changed threshold rebuilds the deque, keeping the newest hits that still fit.
+            dq = self._hits[key] = deque(dq or (), maxlen=cap)
+        dq.append(now)
+        cutoff = now - window
+        while dq[0] < cutoff:
+            dq.popleft()
+        return len(dq)
+
+    def count(self, key, window: float, now: Optional[float]=None) -> int:
+        dq = self._hits.get(key)
+        if not dq:
+            return 0
+        cutoff = (time.monotonic() if now is None else now) - window
+        while dq and dq[0] < cutoff:
+            dq.popleft()
+        return len(dq)
+
+    def reset(self, key):
+        self._hits.pop(key, None)
+
+    def sweep(self, max_age: float, now: Optional[float]=None) -> int:
+        cutoff = (time.monotonic() if now is None else now) - max_age
+        stale = [k for k, dq in self._hits.items() if not dq or dq[-1] < cutoff]
+        for k in stale:
+            del self._hits[k]
+        return len(stale)
+
+    def __len__(self):
+        return len(self._hits)
+
+# ---------------- Bounded stores ----------------
+class SnipeRecord:
+    # Only IDs and text are kept; holding discord.Member objects would pin whole member caches.
+    __slots__ = ("author_id", "author_name", "content", "after", "time")
+
+    def __init__(self, author: discord.abc.User, content: str, after: Optional[str]=None):
+        self.author_id = author.id
+        self.author_name = str(author)
+        self.content = content
+        self.after = after
+        self.time = time.time()
+
+    def nbytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.author_name) + sys.getsizeof(self.content) + (sys.getsizeof(self.after) if self.after else 0)
+
+class BoundedStore:
+    # LRU map with a size cap and a max age per entry. Reads refresh recency but not age, so the
+    # order is by last use and sweep() has to scan for expired entries instead of stopping early.
+    __slots__ = ("max_size", "max_age", "_data", "evicted")
+
+    def __init__(self, max_size: int, max_age: float):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._data = OrderedDict()  # key -> (stored_at, value)
+        self.evicted = 0
+
+    def __setitem__(self, key, value):
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evicted += 1
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        if time.monotonic() - entry[0] > self.max_age:
+            del self._data[key]
+            self.evicted += 1
+            return default
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def __len__(self):
+        return len(self._data)
+
+    def __bool__(self):
+        return bool(self._data)
+
+    def sweep(self) -> int:
+        cutoff = time.monotonic() - self.max_age
+        expired = [k for k, (stored_at, _) in self._data.items() if stored_at < cutoff]
+        for k in expired:
+            del self._data[k]
+        n = len(expired)
+        self.evicted += n
+        return n
+
+    def nbytes(self) -> int:
+        total = sys.getsizeof(self._data)
+        for key, (_, value) in self._data.items():
+            total += sys.getsizeof(key) + (value.nbytes() if hasattr(value, "nbytes") else sys.getsizeof(value))
+        return total
+
+# ---------------- Shards ----------------
+class ShardState:
+    # Caches and counters owned by one shard, so shards never contend on each other's hot maps.
+    __slots__ = ("shard_id", "spam", "chan_del", "joins", "dupes", "snipes", "editsnipes", "events", "rate", "_mark", "_mark_at")
+
+    def __init__(self, shard_id: int):
+        self.shard_id = shard_id
+        self.spam = SlidingWindowCounter()
+        self.chan_del = SlidingWindowCounter()
+        self.joins = {}  # guild id -> JoinWave
+        self.dupes = {}  # guild id -> DuplicateIndex
+        self.snipes = BoundedStore(SNIPE_MAX, SNIPE_MAX_AGE)
+        self.editsnipes = BoundedStore(SNIPE_MAX, SNIPE_MAX_AGE)
+        self.events = 0
+        self.rate = 0.0
+        self._mark = 0
+        self._mark_at = time.monotonic()
+
+    def tick(self):
+        now = time.monotonic()
+        elapsed = now - self._mark_at
+        if elapsed > 0:
+            self.rate = (self.events - self._mark) / elapsed
+        self._mark, self._mark_at = self.events, now
+
+# ---------------- Join raids ----------------
+NAME_NOISE = re.compile(r"[^a-z]+")
+
+def name_skeleton(name: str) -> str:
+    # "Raider_0412" and "raider.77" share the skeleton "raider"; digits and separators are noise.
+    return NAME_NOISE.sub("", name.lower())[:12]
+
+class JoinWave:
+    # One guild's recent joiners in a sliding window plus a running count per name skeleton, so
+    # velocity and name similarity for a new joiner are both O(1) amortized.
+    __slots__ = ("joins", "names", "raid_until", "pending", "actioned", "flusher")
+
+    def __init__(self):
+        self.joins = deque(maxlen=5000)  # (monotonic time, member, skeleton)
+        self.names = {}
+        self.raid_until = 0.0
+        self.pending = []
+        self.actioned = set()
+        self.flusher = None
+
+    def _forget(self, skel: str):
+        n = self.names.get(skel, 0) - 1
+        if n > 0:
+            self.names[skel] = n
+        else:
+            self.names.pop(skel, None)
+
+    def add(self, now: float, member, window: float) -> str:
+        cutoff = now - window
+        joins = self.joins
+        while joins and joins[0][0] < cutoff:
+            self._forget(joins.popleft()[2])
+        if len(joins) == joins.maxlen:
+            self._forget(joins[0][2])
+        skel = name_skeleton(member.name)
+        joins.append((now, member, skel))
+        self.names[skel] = self.names.get(skel, 0) + 1
+        return skel
+
+    def idle(self, now: float) -> bool:
+        return not self.joins and not self.pending and self.raid_until < now
+
+def join_score(member, skel: str, names: dict, now: datetime, min_age: float) -> float:
+    score = 0.0
+    age = (now - member.created_at).total_seconds()
+    if age < min_age:
+        score += 0.5 * (1 - age / min_age)
+    if member.avatar is None:
+        score += 0.25
+    if len(skel) >= 3 and names.get(skel, 0) >= 3:
+        score += 0.35
+    return score
+
+# ---------------- Duplicate content ----------------
+CONTENT_NOISE = re.compile(r"[\W_]+")
+
+def content_fingerprint(content: str, min_length: int) -> Optional[int]:
+    # Case, whitespace, punctuation and zero-width padding are dropped so trivially varied copies
+    # collide; short texts like "gm" or "lol" are never fingerprinted.
+    norm = CONTENT_NOISE.sub("", content.casefold())
+    if len(norm) < min_length:
+        return None
+    return hash(norm)
+
+class DuplicateIndex:
+    # One guild's recent fingerprints in arrival order plus, per fingerprint, the copies still in the
+    # window. Each message is appended and expired exactly once, so upkeep is O(1) amortized and the
+    # index never holds more than max_size messages however many channels or accounts post.
+    __slots__ = ("seen", "copies", "flagged")
+
+    def __init__(self, max_size: int = 2000):
+        self.seen = deque(maxlen=max_size)  # (monotonic time, fingerprint, copy)
+        self.copies = {}  # fingerprint -> deque of (channel id, message id, author id)
+        self.flagged = {}  # fingerprint -> monotonic time until late copies are removed on sight
+
+    def _expire(self, fp: int, copy: tuple):
+        bucket = self.copies.get(fp)
+        # take() may have emptied and restarted this bucket; only the oldest live copy can expire.
+        if bucket and bucket[0] is copy:
+            bucket.popleft()
+            if not bucket:
+                del self.copies[fp]
+
+    def add(self, now: float, fp: int, copy: tuple, window: float) -> deque:
+        seen = self.seen
+        cutoff = now - window
+        while seen and seen[0][0] < cutoff:
+            self._expire(*seen.popleft()[1:])
+        if len(seen) == seen.maxlen:
+            self._expire(*seen.popleft()[1:])
+        seen.append((now, fp, copy))
+        bucket = self.copies.get(fp)
+        if bucket is None:
+            bucket = self.copies[fp] = deque()
+        bucket.append(copy)
+        return bucket
+
+    def take(self, fp: int) -> deque:
+        return self.copies.pop(fp, deque())
+
+    def flag(self, fp: int, until: float, now: float):
+        if len(self.flagged) > 64:
+            self.flagged = {k: v for k, v in self.flagged.items() if v > now}
+        self.flagged[fp] = until
+
+    def idle(self, now: float, max_age: float) -> bool:
+        return (not self.seen or self.seen[-1][0] < now - max_age) and all(v < now for v in self.flagged.values())
+
+# ---------------- Audit-log correlation ----------------
+class AuditLogIndex:
+    # Recent audit-log entries keyed by (guild, action, target). Filled from the gateway's
+    # on_audit_log_entry_create; a coalesced per-guild fetch covers entries that never arrive.
+    # An entry blames exactly one event: it has to be newer than the event (by snowflake) and is
+    # consumed when handed out, so a second edit of the same target waits for its own entry.
+    def __init__(self, ttl: float = 60.0, wait: float = 1.5, fetch_limit: int = 50, skew: float = 5.0):
+        self.ttl = ttl
+        self.wait = wait
+        self.fetch_limit = fetch_limit
+        self.skew = skew
+        self.self_id = None  # the bot's own reverts never get blamed for anything
+        self._entries = OrderedDict()  # (gid, action, target_id) -> (expires, entry_id, user_id)
+        self._used = OrderedDict()  # recently consumed entry ids, so a fetch can't hand them out again
+        self._waiters = {}  # key -> [(since, future)]
+        self._fetches = {}
+        self.hits = 0
+        self.waited = 0
+        self.fetched = 0
+
+    def since(self) -> int:
+        # Oldest entry id that can belong to an event seen now. Discord writes the entry before
+        # dispatching the event; the slack covers clock skew between us and Discord.
+        return discord.utils.time_snowflake(discord.utils.utcnow() - timedelta(seconds=self.skew))
+
+    def _consume(self, entry_id: int):
+        self._used[entry_id] = None
+        if len(self._used) > 1024:
+            self._used.popitem(last=False)
+
+    def add(self, guild_id: int, action, target_id: Optional[int], entry_id: int, user_id: Optional[int]):
+        if entry_id in self._used or (user_id is not None and user_id == self.self_id):
+            return
+        key = (guild_id, action, target_id)
+        waiters = self._waiters.get(key)
+        if waiters:
+            for i, (since, fut) in enumerate(waiters):
+                if entry_id >= since and not fut.done():
+                    del waiters[i]
+                    if not waiters: del self._waiters[key]
+                    self._consume(entry_id)
+                    fut.set_result(user_id)
+                    return
+        current = self._entries.get(key)
+        if current and current[1] >= entry_id:
+            return
+        now = time.monotonic()
+        self._entries[key] = (now + self.ttl, entry_id, user_id)
+        self._entries.move_to_end(key)
+        while self._entries:
+            oldest = next(iter(self._entries.values()))
+            if oldest[0] > now: break
+            self._entries.popitem(last=False)
+
+    def take(self, guild_id: int, action, target_id: int, since: int) -> Optional[int]:
+        key = (guild_id, action, target_id)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic() or entry[1] < since:
+            return None
+        del self._entries[key]
+        self._consume(entry[1])
+        return entry[2]
+
+    async def resolve(self, guild: discord.Guild, action, target_id: int, since: Optional[int]=None) -> Optional[int]:
+        since = self.since() if since is None else since
+        uid = self.take(guild.id, action, target_id, since)
+        if uid is not None:
+            self.hits += 1
+            return uid
+        key = (guild.id, action, target_id)
+        fut = asyncio.get_running_loop().create_future()
+        waiter = (since, fut)
+        self._waiters.setdefault(key, []).append(waiter)
+        try:
+            uid = await asyncio.wait_for(fut, self.wait)
+            self.waited += 1
+            return uid
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters: del self._waiters[key]
+        await self._fetch(guild, action)
+        return self.take(guild.id, action, target_id, since)
+
+    async def _fetch(self, guild: discord.Guild, action):
+        # Every handler that times out on the same guild/action shares one HTTP call.
+        key = (guild.id, action)
+        task = self._fetches.get(key)
+        if task is None:
+            task = self._fetches[key] = asyncio.ensure_future(self._fetch_batch(guild, action))
+            task.add_done_callback(lambda _: self._fetches.pop(key, None))
+        await asyncio.shield(task)
+
+    async def _fetch_batch(self, guild: discord.Guild, action):
+        self.fetched += 1
+        async for entry in guild.audit_logs(limit=self.fetch_limit, action=action):
+            self.add(guild.id, action, getattr(entry.target, "id", None), entry.id, entry.user_id)
+
+# ---------------- REST scheduler ----------------
+LANE_CONTAINMENT, LANE_MODERATION, LANE_LOGGING = 0, 1, 2
+LANE_NAMES = ("containment", "moderation", "logging")
+
+class RestJob:
+    __slots__ = ("lane", "bucket", "factory", "idempotent", "future", "attempts")
+
+    def __init__(self, lane: int, bucket: str, factory, idempotent: bool, future: asyncio.Future):
+        self.lane = lane
+        self.bucket = bucket
+        self.factory = factory
+        self.idempotent = idempotent
+        self.future = future
+        self.attempts = 0
+
+class RestScheduler:
+    # Discord calls the bot makes on its own go through here. Workers always take the highest-priority
+    # runnable job, and the lower lanes together may only occupy part of the pool, so at least one
+    # worker is always free for containment and it never waits behind log embeds. A bucket that
+    # answers 429 is parked until it resets; transient failures are retried with backoff, but only
+    # for calls that are safe to repeat.
+    def __init__(self, workers: int = 8, lane_caps: tuple = (None, 5, 2), bucket_concurrency: int = 2,
+                 retries: int = 3, base_delay: float = 0.5):
+        if None in lane_caps[1:] or sum(lane_caps[1:]) >= workers:
+            raise ValueError("lower-lane caps must leave at least one worker for containment")
+        self.workers = workers
+        self.lane_caps = lane_caps
+        self.bucket_concurrency = bucket_concurrency
+        self.retries = retries
+        self.base_delay = base_delay
+        self._queues = [deque() for _ in LANE_NAMES]
+        self._active = [0] * len(LANE_NAMES)
+        self._bucket_active = {}
+        self._parked = {}  # bucket -> monotonic time it may be used again
+        self._running = set()
+        self._delayed = {}  # job -> TimerHandle of a pending retry
+        self._wakeup = None
+        self._tasks = []
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.rate_limited = 0
+
+    def run(self, lane: int, bucket: str, factory, idempotent: bool = True) -> asyncio.Future:
+        # factory builds a fresh coroutine per attempt, e.g. lambda: member.edit(...)
+        if not self._tasks:
+            self._wakeup = asyncio.Event()
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        job = RestJob(lane, bucket, factory, idempotent, asyncio.get_running_loop().create_future())
+        self._queues[lane].append(job)
+        self._wakeup.set()
+        return job.future
+
+    def depth(self) -> dict:
+        return {name: len(q) + self._active[i] for i, (name, q) in enumerate(zip(LANE_NAMES, self._queues))}
+
+    def _pick(self) -> tuple:
+        now = time.monotonic()
+        next_free = None
+        for lane, q in enumerate(self._queues):
+            cap = self.lane_caps[lane]
+            if not q or (cap is not None and self._active[lane] >= cap):
+                continue
+            for job in q:
+                until = self._parked.get(job.bucket)
+                if until is not None:
+                    if until > now:
+                        next_free = until if next_free is None else min(next_free, until)
+                        continue
+                    del self._parked[job.bucket]
+                if self._bucket_active.get(job.bucket, 0) < self.bucket_concurrency:
+                    q.remove(job)
+                    return job, None
+        return None, next_free
+
+    async def _worker(self):
+        while True:
+            job, next_free = self._pick()
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), None if next_free is None else max(0.0, next_free - time.monotonic()))
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._active[job.lane] += 1
+            self._bucket_active[job.bucket] = self._bucket_active.get(job.bucket, 0) + 1
+            self._running.add(job)
+            try:
+                await self._execute(job)
+            except Exception as e:
+                # A worker must never die with the job; the pool would quietly shrink.
+                log.exception(f"REST job on {job.bucket} failed unexpectedly")
+                self._resolve(job, error=e)
+            finally:
+                self._running.discard(job)
+                self._active[job.lane] -= 1
+                n = self._bucket_active.pop(job.bucket) - 1
+                if n:
+                    self._bucket_active[job.bucket] = n
+                self._wakeup.set()
+
+    async def _execute(self, job: RestJob):
+        if job.future.done():
+            return
+        job.attempts += 1
+        try:
+            result = await job.factory()
+        except discord.RateLimited as e:
+            self._rate_limited(job, e.retry_after, e)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                self._rate_limited(job, float(getattr(e.response, "headers", {}).get("Retry-After", 1) or 1), e)
+            elif e.status >= 500 and job.idempotent:
+                self._retry(job, e)
+            else:
+                self.failed += 1
+                self._resolve(job, error=e)
+        except (asyncio.TimeoutError, OSError) as e:
+            if job.idempotent:
+                self._retry(job, e)
+            else:
+                self.failed += 1
+                self._resolve(job, error=e)
+        except Exception as e:
+            self.failed += 1
+            self._resolve(job, error=e)
+        else:
+            self.completed += 1
+            self._resolve(job, result)
+
+    def _resolve(self, job: RestJob, result=None, error: Optional[Exception]=None):
+        # The caller (or close()) may have cancelled the future while the call was in flight.
+        if job.future.done():
+            return
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+
+    def _rate_limited(self, job: RestJob, retry_after: float, error: Exception):
+        # A 429 means the call was not applied, so it is safe to repeat even when not idempotent.
+        self.rate_limited += 1
+        self._parked[job.bucket] = max(self._parked.get(job.bucket, 0), time.monotonic() + retry_after)
+        if job.attempts > self.retries:
+            self.failed += 1
+            return self._resolve(job, error=error)
+        self.retried += 1
+        self._queues[job.lane].appendleft(job)
+
+    def _retry(self, job: RestJob, error: Exception):
+        if job.attempts > self.retries:
+            self.failed += 1
+            return self._resolve(job, error=error)
+        self.retried += 1
+        delay = self.base_delay * 2 ** (job.attempts - 1) * random.uniform(0.8, 1.2)
+        self._delayed[job] = asyncio.get_running_loop().call_later(delay, self._requeue, job)
+
+    def _requeue(self, job: RestJob):
+        self._delayed.pop(job, None)
+        if job.future.done():
+            return
+        self._queues[job.lane].appendleft(job)
+        self._wakeup.set()
+
+    async def close(self):
+        tasks, self._tasks = self._tasks, []
+        jobs = list(self._running)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for handle in self._delayed.values():
+            handle.cancel()
+        jobs += [job for q in self._queues for job in q] + list(self._delayed)
+        for q in self._queues:
+            q.clear()
+        self._delayed.clear()
+        self._running.clear()
+        for job in jobs:
+            if not job.future.done():
+                job.future.cancel()
+
+# ---------------- Punishment ----------------
+def is_dangerous_role(role: discord.Role) -> bool:
+    p = role.permissions
+    return not role.is_default() and (p.administrator or p.manage_guild or p.manage_roles)
+
+class PunishmentExecutor:
+    # Timeout and dangerous-role strip go out as a single member PATCH; repeat triggers for the
+    # same offender inside dedupe_window are dropped, and each guild gets a bounded number of
+    # concurrent edits so a raid with many offenders doesn't trip the global rate limit.
+    def __init__(self, dedupe_window: float = 10.0, per_guild: int = 5, rest: Optional[RestScheduler] = None):
+        self.dedupe_window = dedupe_window
+        self.per_guild = per_guild
+        self.rest = rest
+        self._recent = {}
+        self._guild_sems = {}
+        self.executed = 0
+        self.deduped = 0
+
+    def _claim(self, guild_id: int, user_id: int) -> bool:
+        now = time.monotonic()
+        key = (guild_id, user_id)
+        if self._recent.get(key, 0) > now:
+            return False
+        if len(self._recent) > 1024:
+            self._recent = {k: v for k, v in self._recent.items() if v > now}
+        self._recent[key] = now + self.dedupe_window
+        return True
+
+    def _edit(self, member: discord.Member, **kwargs):
+        if self.rest is None:
+            return member.edit(**kwargs)
+        return self.rest.run(LANE_CONTAINMENT, f"member:{member.guild.id}", lambda: member.edit(**kwargs))
+
+    async def punish(self, member: discord.Member, timeout_seconds: int, strip_roles: bool, reason: str) -> Optional[list]:
+        if not self._claim(member.guild.id, member.id):
+            self.deduped += 1
+            return None
+        until = datetime.now(timezone.utc) + timedelta(seconds=timeout_seconds)
+        stripped = [r for r in member.roles if is_dangerous_role(r)] if strip_roles else []
+        keep = [r for r in member.roles if not r.is_default() and r not in stripped]
+        sem = self._guild_sems.get(member.guild.id)
+        if sem is None:
+            sem = self._guild_sems[member.guild.id] = asyncio.Semaphore(self.per_guild)
+        async with sem:
+            self.executed += 1
+            try:
+                if stripped and member.guild_permissions.administrator:
+                    # Discord refuses to time out administrators, so the strip has to land first.
+                    await self._edit(member, roles=keep, reason=reason)
+                    await self._edit(member, timed_out_until=until, reason=reason)
+                elif stripped:
+                    await self._edit(member, roles=keep, timed_out_until=until, reason=reason)
+                else:
+                    await self._edit(member, timed_out_until=until, reason=reason)
+            except discord.Forbidden:
+                # Hierarchy can block one half of the combined edit; still apply whatever is allowed.
+                calls = [self._edit(member, timed_out_until=until, reason=reason)]
+                if stripped:
+                    calls.append(self._edit(member, roles=keep, reason=reason))
+                results = await asyncio.gather(*calls, return_exceptions=True)
+                if stripped and isinstance(results[-1], Exception):
+                    stripped = []
+        return stripped
+
+# ---------------- Mod-log queue ----------------
+LOG_CHANNEL_NAMES = ("mod-log", "logs", "The Studio-logs")
+
+class ModLogQueue:
+    # Per-guild log buffer: embeds are packed BATCH to a message and sent when the batch fills or
+    # flush_interval passes, one send in flight per guild. Past max_pending the oldest routine entries
+    # are dropped and folded into a summary embed so logging never competes with containment;
+    # priority entries (containment alerts) are never dropped.
+    BATCH = 10
+
+    def __init__(self, flush_interval: float = 1.0, max_pending: int = 50, channel_ttl: float = 300, rest: Optional[RestScheduler] = None):
+        self.rest = rest
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.channel_ttl = channel_ttl
+        self._queues = {}   # gid -> deque of (priority, embed)
+        self._dropped = {}  # gid -> {title: count}
+        self._targets = {}  # gid -> configured log channel id
+        self._full = {}     # gid -> Event set when a full batch is waiting
+        self._tasks = {}
+        self._channels = {}  # gid -> (expires, configured id, resolved id or None)
+        self.sent = 0
+        self.embeds = 0
+        self.dropped = 0
+
+    def invalidate(self, gid=None):
+        if gid is None:
+            self._channels.clear()
+        else:
+            self._channels.pop(int(gid), None)
+
+    def channel(self, guild: discord.Guild, log_channel_id: Optional[int]) -> Optional[discord.TextChannel]:
+        entry = self._channels.get(guild.id)
+        if entry and entry[0] > time.monotonic() and entry[1] == log_channel_id:
+            ch = guild.get_channel(entry[2]) if entry[2] else None
+            if ch is not None or entry[2] is None:
+                return ch
+        ch = guild.get_channel(log_channel_id) if log_channel_id else None
+        if not isinstance(ch, discord.TextChannel):
+            ch = None
+            for name in LOG_CHANNEL_NAMES:
+                ch = discord.utils.get(guild.text_channels, name=name)
+                if ch: break
+        self._channels[guild.id] = (time.monotonic() + self.channel_ttl, log_channel_id, ch.id if ch else None)
+        return ch
+
+    def post(self, guild: discord.Guild, embed: discord.Embed, log_channel_id: Optional[int] = None, priority: bool = False):
+        q = self._queues.get(guild.id)
+        if q is None:
+            q = self._queues[guild.id] = deque()
+            self._full[guild.id] = asyncio.Event()
+        if len(q) >= self.max_pending:
+            victim = next((item for item in q if not item[0]), None)
+            if victim is not None:
+                q.remove(victim)
+                self._drop(guild.id, victim[1])
+            elif not priority:
+                # Only alerts are queued, so the new routine entry is the one to go.
+                self._drop(guild.id, embed)
+                return self._ensure_flusher(guild, log_channel_id)
+        q.append((priority, embed))
+        if len(q) >= self.BATCH:
+            self._full[guild.id].set()
+        self._ensure_flusher(guild, log_channel_id)
+
+    def _drop(self, gid: int, embed: discord.Embed):
+        counts = self._dropped.setdefault(gid, {})
+        counts[embed.title] = counts.get(embed.title, 0) + 1
+        self.dropped += 1
+
+    def _ensure_flusher(self, guild: discord.Guild, log_channel_id: Optional[int]):
+        self._targets[guild.id] = log_channel_id
+        task = self._tasks.get(guild.id)
+        if task is None or task.done():
+            self._tasks[guild.id] = asyncio.ensure_future(self._flusher(guild))
+
+    def pending(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def _flusher(self, guild: discord.Guild):
+        q, full = self._queues[guild.id], self._full[guild.id]
+        while q:
+            if len(q) < self.BATCH:
+                try:
+                    await asyncio.wait_for(full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            full.clear()
+            items = [q.popleft() for _ in range(min(self.BATCH, len(q)))]
+            dropped = self._dropped.pop(guild.id, None)
+            if dropped and len(items) == self.BATCH:
+                q.appendleft(items.pop())
+            batch = [embed for _, embed in items]
+            if dropped:
+                lines = [f"{BOLD(str(n))} × {title or 'Log entry'}" for title, n in sorted(dropped.items(), key=lambda kv: -kv[1])]
+                batch.append(ok_embed("Log Entries Suppressed", "Too many events to log individually:\n" + "\n".join(lines)))
+            ch = self.channel(guild, self._targets.get(guild.id))
+            if ch is None:
+                continue
+            try:
+                if self.rest is None:
+                    await ch.send(embeds=batch)
+                else:
+                    await self.rest.run(LANE_LOGGING, f"channel:{ch.id}", partial(ch.send, embeds=batch), idempotent=False)
+                self.sent += 1
+                self.embeds += len(batch)
+            except discord.HTTPException as e:
+                log.warning(f"Mod-log send failed in guild {guild.id}: {e!r}")
+        if not q:
+            self._queues.pop(guild.id, None)
+            self._full.pop(guild.id, None)
+
+    async def drain(self, timeout: float = 5.0):
+        for ev in self._full.values():
+            ev.set()
+        tasks = [t for t in self._tasks.values() if not t.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+# ---------------- Permission overwrite rollouts ----------------
+JAIL_OVERWRITE = dict(view_channel=False, send_messages=False, speak=False, send_messages_in_threads=False, add_reactions=False)
+
+LOCKDOWN_OVERWRITE = dict(send_messages=False, add_reactions=False, create_public_threads=False, create_private_threads=False, send_messages_in_threads=False)
+
+def lockdown_overwrite(ch, checkpoint: dict) -> discord.PermissionOverwrite:
+    ow = ch.overwrites_for(ch.guild.default_role)
+    ow.update(**LOCKDOWN_OVERWRITE)
+    return ow
+
+def restore_overwrite(ch, checkpoint: dict) -> Optional[discord.PermissionOverwrite]:
+    # Snapshot entries are [allow, deny] bitfields, or None when the channel had no overwrite.
+    snap = checkpoint.get("snapshot", {})
+    if str(ch.id) not in snap:
+        return ch.overwrites_for(ch.guild.default_role)  # created during the lockdown: leave as is
+    pair = snap[str(ch.id)]
+    return None if pair is None else discord.PermissionOverwrite.from_pair(discord.Permissions(pair[0]), discord.Permissions(pair[1]))
+
+def snapshot_overwrites(channels, target) -> dict:
+    out = {}
+    for ch in channels:
+        ow = ch.overwrites.get(target)
+        out[str(ch.id)] = None if ow is None else [p.value for p in ow.pair()]
+    return out
+
+ROLLOUT_OVERWRITES = {
+    "jail": lambda ch, checkpoint: discord.PermissionOverwrite(**JAIL_OVERWRITE),
+    "lockdown": lockdown_overwrite,
+    "unlockdown": restore_overwrite,
+}
+def finish_unlockdown(rollout, g: dict) -> dict:
+    # Channels whose restore failed keep their snapshot entries so the next unlockdown can retry them.
+    state = g.get("lockdown")
+    if not state or not rollout.failed_ids:
+        return {"lockdown": None}
+    snap = state.get("snapshot", {})
+    return {"lockdown": {**state, "partial": True, "snapshot": {k: v for k, v in snap.items() if int(k) in rollout.failed_ids}}}
+
+ROLLOUT_SCOPES = {"lockdown": lambda g: g.text_channels, "unlockdown": lambda g: g.text_channels}  # default: every channel
+ROLLOUT_FINISH = {"unlockdown": finish_unlockdown}  # extra guild patch written with the final checkpoint
+
+class OverwriteRollout:
+    # Applies one target's overwrite across every channel of a guild with bounded concurrency.
+    # Channels that already match are skipped, and the set of finished channels is checkpointed
+    # under guild data "rollout_<kind>" so an interrupted rollout resumes after a restart. One key per
+    # kind keeps concurrent rollouts in a guild from writing back each other's stale checkpoints.
+    CHECKPOINT_EVERY = 25
+    PROGRESS_EVERY = 2.0
+
+    def __init__(self, db, guild: discord.Guild, kind: str, target, checkpoint: Optional[dict]=None,
+                 concurrency: int = 5, progress=None, reason: Optional[str]=None, rest: Optional[RestScheduler]=None):
+        self.db = db
+        self.rest = rest
+        self.lane = LANE_CONTAINMENT if kind == "lockdown" else LANE_MODERATION
+        self.guild = guild
+        self.kind = kind
+        self.target = target
+        self.checkpoint = checkpoint or {}
+        self.overwrite_for = ROLLOUT_OVERWRITES[kind]
+        self.concurrency = concurrency
+        self.progress = progress
+        self.reason = reason or f"The Studio {kind} overwrites"
+        self.done = set(self.checkpoint.get("done", []))
+        self.failed_ids = set(self.checkpoint.get("failed", []))
+        self.total = 0
+        self.changed = self.skipped = 0
+        self.failed = len(self.failed_ids)
+        self._since_checkpoint = 0
+        self._last_report = 0.0
+        self.started = 0.0
+
+    async def _save(self, finished: bool = False):
+        key = f"rollout_{self.kind}"
+        if finished:
+            patch = {key: None}
+            finish = ROLLOUT_FINISH.get(self.kind)
+            if finish:
+                patch.update(finish(self, await self.db.get_guild(self.guild.id)))
+        else:
+            patch = {key: {**self.checkpoint, "target_id": self.target.id, "done": list(self.done), "failed": list(self.failed_ids)}}
+        await self.db.update_guild(self.guild.id, patch)
+
+    async def _report(self, final: bool = False):
+        now = time.monotonic()
+        if self.progress is None or (not final and now - self._last_report < self.PROGRESS_EVERY):
+            return
+        self._last_report = now
+        try:
+            await self.progress(self, final)
+        except Exception:
+            log.debug("Rollout progress callback failed", exc_info=True)
+
+    async def _apply(self, ch, want) -> bool:
+        if self.rest is not None:
+            try:
+                await self.rest.run(self.lane, f"channel:{ch.id}", partial(ch.set_permissions, self.target, overwrite=want, reason=self.reason))
+                return True
+            except discord.HTTPException:
+                return False
+        for attempt in range(4):
+            try:
+                await ch.set_permissions(self.target, overwrite=want, reason=self.reason)
+                return True
+            except (discord.Forbidden, discord.NotFound):
+                return False
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    return False
+                # HTTPException has no retry_after; a 429 that reaches us carries the Retry-After header.
+                await asyncio.sleep(float(getattr(e.response, "headers", {}).get("Retry-After", 0) or 0) or 2 ** attempt)
+        return False
+
+    async def run(self) -> "OverwriteRollout":
+        self.started = time.monotonic()
+        scope = ROLLOUT_SCOPES.get(self.kind)
+        channels = [ch for ch in (scope(self.guild) if scope else self.guild.channels) if ch.id not in self.done]
+        self.total = len(channels) + len(self.done)
+        await self._save()
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(ch):
+            async with sem:
+                want = self.overwrite_for(ch, self.checkpoint)
+                have = ch.overwrites_for(self.target)
+                if (have.is_empty() if want is None else have == want):
+                    self.skipped += 1
+                elif await self._apply(ch, want):
+                    self.changed += 1
+                else:
+                    self.failed += 1
+                    self.failed_ids.add(ch.id)
+                self.done.add(ch.id)
+                self._since_checkpoint += 1
+                if self._since_checkpoint >= self.CHECKPOINT_EVERY:
+                    self._since_checkpoint = 0
+                    await self._save()
+                await self._report()
+
+        await asyncio.gather(*(one(ch) for ch in channels))
+        await self._save(finished=True)
+        await self._report(final=True)
+        return self
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started if self.started else 0.0
+
+    def summary(self) -> str:
+        return (f"{len(self.done)}/{self.total} channels • changed {self.changed} • "
+                f"already correct {self.skipped} • failed {self.failed} • {self.elapsed:.1f}s")
+
+# ---------------- Timers ----------------
+class TimerScheduler:
+    # Persistent one-shot timers (auto-unjail, temprole expiry, reminders). Pending timers live in
+    # the DB and a min-heap; a single task sleeps until the earliest one is due.
+    def __init__(self, bot):
+        self.bot = bot
+        self._heap = []  # (due, id); cancelled/rescheduled ids are skipped lazily
+        self._timers = {}
+        self._handlers = {}
+        self._wakeup = None
+        self._task = None
+        self.fired = 0
+
+    def register(self, kind: str, handler):
+        self._handlers[kind] = handler
+
+    def __len__(self):
+        return len(self._timers)
+
+    def _push(self, timer: dict):
+        self._timers[timer["id"]] = timer
+        heapq.heappush(self._heap, (float(timer["due"]), timer["id"]))
+        if self._heap[0][1] == timer["id"] and self._wakeup is not None:
+            self._wakeup.set()
+
+    @staticmethod
+    def owns(timer: dict) -> bool:
+        # Cluster workers share one DB, so each only loads timers for guilds on its own shards;
+        # guild-less timers (reminders set in DMs) belong to whoever runs shard 0.
+        if not SHARD_COUNT or not SHARD_IDS:
+            return True
+        return (int(timer.get("gid") or 0) >> 22) % int(SHARD_COUNT) in {int(i) for i in SHARD_IDS}
+
+    async def load(self):
+        for timer in await self.bot.db.get_timers():
+            if self.owns(timer):
+                self._push(timer)
+        if self._timers:
+            log.info(f"Loaded {len(self._timers)} pending timers")
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def schedule(self, timer_id: str, kind: str, due: float, **data) -> dict:
+        timer = {"id": timer_id, "kind": kind, "due": float(due), **data}
+        await self.bot.db.add_timer(timer)
+        self._push(timer)
+        return timer
+
+    async def cancel(self, timer_id: str) -> bool:
+        if self._timers.pop(timer_id, None) is None:
+            return False
+        await self.bot.db.remove_timer(timer_id)
+        return True
+
+    async def _fire(self, timer: dict):
+        handler = self._handlers.get(timer.get("kind"))
+        try:
+            if handler is None:
+                log.warning(f"No handler for timer kind {timer.get('kind')!r}; dropping {timer['id']}")
+            else:
+                await handler(timer)
+        except Exception:
+            log.exception(f"Timer {timer['id']} failed")
+        finally:
+            self.fired += 1
+            if self._timers.get(timer["id"]) is timer:
+                del self._timers[timer["id"]]
+                await self.bot.db.remove_timer(timer["id"])
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            now = time.time()
+            while self._heap and self._heap[0][0] <= now:
+                due, tid = heapq.heappop(self._heap)
+                timer = self._timers.get(tid)
+                if timer is not None and float(timer["due"]) == due:
+                    asyncio.ensure_future(self._fire(timer))
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
 # ---------------- Data layer ----------------
+def audit_ts(value) -> float:
+    if isinstance(value, str):
+        try: return datetime.fromisoformat(value).timestamp()
+        except ValueError: return time.time()
+    return float(value) if value else time.time()
+
+def audit_limits(retention: Optional[dict]) -> tuple:
+    r = retention or {}
+    return int(r.get("max_entries", AUDIT_MAX_ENTRIES)), float(r.get("max_age_days", AUDIT_MAX_AGE_DAYS)) * 86400
+
+class AuditSegments:
+    # Per-guild JSONL segment files: appends are O(entry), retention drops whole segments.
+    # Segments are capped at half of max_entries, so at most that many stale entries stay on
+    # disk; query() applies max_entries/max_age exactly, so callers never see them.
+    # All methods do blocking file I/O and are meant to run in a worker thread; the lock keeps
+    # concurrent appends and queries from racing on the segment index.
+    def __init__(self, root: str, segment_size: int = 500):
+        self.root = root
+        self.segment_size = segment_size
+        self._segs = {}  # gid -> [[seq, first_ts, last_ts, count], ...] oldest first
+        self._lock = threading.Lock()
+
+    def _dir(self, gid: str) -> str:
+        return os.path.join(self.root, gid)
+
+    def _path(self, gid: str, seq: int) -> str:
+        return os.path.join(self.root, gid, f"{seq:08d}.jsonl")
+
+    def _read(self, gid: str, seq: int) -> list:
+        out = []
+        try:
+            with open(self._path(gid, seq), "r", encoding="utf-8") as f:
+                for line in f:
+                    try: out.append(json.loads(line))
+                    except ValueError: pass
+        except FileNotFoundError:
+            pass
+        return out
+
+    def _load(self, gid: str) -> list:
+        segs = self._segs.get(gid)
+        if segs is not None:
+            return segs
+        segs = []
+        if os.path.isdir(self._dir(gid)):
+            for name in sorted(os.listdir(self._dir(gid))):
+                if not name.endswith(".jsonl"): continue
+                seq = int(name[:-6])
+                entries = self._read(gid, seq)
+                if entries:
+                    segs.append([seq, entries[0]["time"], entries[-1]["time"], len(entries)])
+        self._segs[gid] = segs
+        return segs
+
+    def _prune(self, gid: str, segs: list, max_entries: int, max_age: float):
+        cutoff = time.time() - max_age if max_age else None
+        total = sum(s[3] for s in segs)
+        while segs:
+            oldest = segs[0]
+            if not ((max_entries and total - oldest[3] >= max_entries) or (cutoff and oldest[2] < cutoff)):
+                break
+            try: os.remove(self._path(gid, oldest[0]))
+            except FileNotFoundError: pass
+            total -= oldest[3]
+            segs.pop(0)
+
+    def append(self, gid, entry: dict, max_entries: int, max_age: float):
+        with self._lock:
+            self._append(str(gid), entry, max_entries, max_age)
+
+    def import_entries(self, gid, entries: list, max_entries: int, max_age: float):
+        # Replaces whatever a previous, interrupted import left behind, so it is safe to re-run.
+        gid = str(gid)
+        with self._lock:
+            shutil.rmtree(self._dir(gid), ignore_errors=True)
+            self._segs.pop(gid, None)
+            for e in entries:
+                self._append(gid, e, max_entries, max_age)
+
+    def _append(self, gid: str, entry: dict, max_entries: int, max_age: float):
+        segs = self._load(gid)
+        cap = max(1, min(self.segment_size, max_entries // 2)) if max_entries else self.segment_size
+        if not segs or segs[-1][3] >= cap:
+            os.makedirs(self._dir(gid), exist_ok=True)
+            segs.append([segs[-1][0] + 1 if segs else 0, entry["time"], entry["time"], 0])
+        seg = segs[-1]
+        with open(self._path(gid, seg[0]), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        seg[2] = entry["time"]
+        seg[3] += 1
+        self._prune(gid, segs, max_entries, max_age)
+
+    def query(self, gid, since: Optional[float], until: Optional[float], actor_id: Optional[int], limit: int, max_entries: int = 0, max_age: float = 0) -> list:
+        with self._lock:
+            return self._query(str(gid), since, until, actor_id, limit, max_entries, max_age)
+
+    def _query(self, gid: str, since: Optional[float], until: Optional[float], actor_id: Optional[int], limit: int, max_entries: int, max_age: float) -> list:
+        if max_age:
+            since = max(since or 0, time.time() - max_age)
+        out, seen = [], 0
+        for seq, first, last, count in reversed(list(self._load(gid))):
+            if since is not None and last < since: break
+            if until is not None and first > until:
+                seen += count
+                continue
+            for e in reversed(self._read(gid, seq)):
+                seen += 1
+                if max_entries and seen > max_entries:
+                    return out
+                t = e.get("time", 0)
+                if (since is not None and t < since) or (until is not None and t > until): continue
+                if actor_id is not None and e.get("actor_id") != actor_id: continue
+                out.append(e)
+                if len(out) >= limit:
+                    return out
+        return out
+
+WARN_FIELDS = ("id", "reason", "moderator_id", "time", "ts")
+
+def warn_ts(warn: dict) -> int:
+    # Older warns only carry the ISO string; new ones store the epoch too so listing never parses.
+    ts = warn.get("ts")
+    return int(ts) if ts is not None else int(datetime.fromisoformat(warn["time"]).timestamp())
+
 class AbstractDB:
     async def init(self): ...
     async def get_guild(self, gid): ...
@@ -184,13 +1505,31 @@ class AbstractDB:
     async def add_warn(self, gid, uid, warn): ...
     async def remove_warn(self, gid, uid, warn_id): ...
     async def get_warns(self, gid, uid): ...
+    async def add_warns(self, gid, items: list): ...  # [(uid, warn), ...] in one write
+    async def count_warns(self, gid, uid) -> int: ...
+    async def page_warns(self, gid, uid, offset: int=0, limit: int=10) -> list: ...  # newest first, WARN_FIELDS only
     async def clear_warns(self, gid, uid): ...
-    async def audit(self, gid, entry: dict): ...
+    async def audit(self, gid, entry: dict, retention: Optional[dict]=None): ...
+    async def query_audit(self, gid, since: Optional[float]=None, until: Optional[float]=None, actor_id: Optional[int]=None, limit: int=50, retention: Optional[dict]=None): ...
+    async def add_timer(self, timer: dict): ...
+    async def remove_timer(self, timer_id: str): ...
+    async def get_timers(self) -> list: ...
+    async def flush(self): ...
+    def flush_sync(self): ...
+    def close(self): ...
 
 class JSONDB(AbstractDB):
-    def __init__(self, path: str):
+    def __init__(self, path: str, commit_interval: float = 0.5):
         self.path = path
         self.data = {"guilds": {}}
+        self.commit_interval = commit_interval
+        self.commits_requested = 0
+        self.commits_written = 0
+        self._dirty = False
+        self._flush_task = None
+        self._flush_failures = 0
+        self._write_lock = None
+        self.audit_log = AuditSegments(os.path.splitext(path)[0] + "_audit", AUDIT_SEGMENT_SIZE)
 
     async def init(self):
         if os.path.exists(self.path):
@@ -200,15 +1539,72 @@ class JSONDB(AbstractDB):
             except Exception:
                 log.exception("Failed to load JSON DB; starting fresh.")
                 self.data = {"guilds": {}}
+            # Older files kept audit entries inline; move them into the segment store. The snapshot
+            # without them is written straight away, and a crash before that just redoes the import.
+            legacy = {gid: g.pop("audit") for gid, g in self.data["guilds"].items() if "audit" in g}
+            for gid, entries in legacy.items():
+                await asyncio.to_thread(self.audit_log.import_entries, gid, [{**e, "time": audit_ts(e.get("time"))} for e in entries], *audit_limits(None))
+            if legacy:
+                self._dirty = True
+                await JSONDB.flush(self)
         else:
             await self._commit()
 
+    @property
+    def commits_saved(self) -> int:
+        return self.commits_requested - self.commits_written
+
     async def _commit(self):
+        # Mutations only mark the DB dirty; one write per commit_interval covers the whole burst.
+        self.commits_requested += 1
+        self._dirty = True
+        if self.commit_interval <= 0:
+            return await self.flush()
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self, delay: Optional[float]=None):
+        await asyncio.sleep(self.commit_interval if delay is None else delay)
+        self._flush_task = None
+        try:
+            await self.flush()
+            self._flush_failures = 0
+        except Exception:
+            # The data is still dirty; retry with backoff instead of waiting for an unrelated write.
+            self._flush_failures += 1
+            delay = min(60.0, self.commit_interval * 2 ** self._flush_failures)
+            log.exception(f"JSON DB flush failed; retrying in {delay:.1f}s")
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._delayed_flush(delay))
+
+    def _write(self, payload: str):
         tmp = self.path + ".tmp"
         with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(self.data, f, indent=2, ensure_ascii=False)
+            f.write(payload)
         os.replace(tmp, self.path)
 
+    async def flush(self):
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        async with self._write_lock:
+            if not self._dirty:
+                return
+            self._dirty = False
+            # Serialize on the loop so the thread never sees a dict being mutated.
+            payload = json.dumps(self.data, indent=2, ensure_ascii=False)
+            try:
+                await asyncio.to_thread(self._write, payload)
+            except Exception:
+                self._dirty = True
+                raise
+            self.commits_written += 1
+
+    def flush_sync(self):
+        if self._dirty:
+            self._dirty = False
+            self._write(json.dumps(self.data, indent=2, ensure_ascii=False))
+            self.commits_written += 1
+
     async def get_guild(self, gid):
         return self.data["guilds"].get(str(gid), {})
 
@@ -243,20 +1639,361 @@ class JSONDB(AbstractDB):
         g = self.data["guilds"].get(str(gid), {})
         return g.get("warns", {}).get(str(uid), [])
 
+    async def add_warns(self, gid, items: list):
+        warns = self.data["guilds"].setdefault(str(gid), {}).setdefault("warns", {})
+        for uid, warn in items:
+            warns.setdefault(str(uid), []).append(warn)
+        await self._commit()
+
+    async def count_warns(self, gid, uid) -> int:
+        return len(self.data["guilds"].get(str(gid), {}).get("warns", {}).get(str(uid), []))
+
+    async def page_warns(self, gid, uid, offset: int=0, limit: int=10) -> list:
+        warns = self.data["guilds"].get(str(gid), {}).get("warns", {}).get(str(uid), [])
+        end = max(0, len(warns) - offset)
+        return [{k: w[k] for k in WARN_FIELDS if k in w} for w in reversed(warns[max(0, end - limit):end])]
+
     async def clear_warns(self, gid, uid):
         g = self.data["guilds"].setdefault(str(gid), {})
         g.setdefault("warns", {})[str(uid)] = []
         await self._commit()
 
-    async def audit(self, gid, entry: dict):
-        g = self.data["guilds"].setdefault(str(gid), {})
-        g.setdefault("audit", []).append(entry)
+    async def audit(self, gid, entry: dict, retention: Optional[dict]=None):
+        await asyncio.to_thread(self.audit_log.append, gid, {**entry, "time": audit_ts(entry.get("time"))}, *audit_limits(retention))
+
+    async def query_audit(self, gid, since: Optional[float]=None, until: Optional[float]=None, actor_id: Optional[int]=None, limit: int=50, retention: Optional[dict]=None):
+        return await asyncio.to_thread(self.audit_log.query, gid, since, until, actor_id, limit, *audit_limits(retention))
+
+    async def add_timer(self, timer: dict):
+        self.data.setdefault("timers", {})[timer["id"]] = timer
         await self._commit()
 
+    async def remove_timer(self, timer_id: str):
+        if self.data.get("timers", {}).pop(timer_id, None) is not None:
+            await self._commit()
+
+    async def get_timers(self) -> list:
+        return list(self.data.get("timers", {}).values())
+
+class JournalJSONDB(JSONDB):
+    # Appends each mutation to <path>.wal and only rewrites the full snapshot on compaction.
+    commits_saved = None  # every mutation is its own WAL record; nothing is coalesced
+    def __init__(self, path: str, fsync_every: int = 50, compact_every: int = 1000):
+        super().__init__(path, commit_interval=0)
+        self.wal_path = path + ".wal"
+        self.fsync_every = fsync_every
+        self.compact_every = compact_every
+        self._wal = None
+        self._pending = []
+        self._seq = 0
+        self._unsynced = 0
+        self._since_snapshot = 0
+        self._replaying = False
+        self._compacting = False
+        self._wal_lock = None
+
+    async def init(self):
+        await super().init()
+        self._seq = int(self.data.get("journal_seq", 0))
+        if os.path.exists(self.wal_path):
+            self._replaying = True
+            good = 0  # byte offset just past the last intact record
+            try:
+                with open(self.wal_path, "rb") as f:
+                    for line in f:
+                        try:
+                            if not line.endswith(b"\n"):
+                                raise ValueError("unterminated record")
+                            rec = json.loads(line)
+                        except ValueError:
+                            log.warning("Journal ends with a torn record; truncating the tail.")
+                            break
+                        good += len(line)
+                        if rec["seq"] <= self._seq:
+                            continue
+                        await getattr(JSONDB, rec["op"])(self, *rec["args"])
+                        self._seq = rec["seq"]
+                        self._since_snapshot += 1
+            finally:
+                self._replaying = False
+            # Appending after a torn line would glue the next record onto it and hide everything after.
+            if good < os.path.getsize(self.wal_path):
+                os.truncate(self.wal_path, good)
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+        if self._since_snapshot:
+            log.info(f"Replayed {self._since_snapshot} journal records from {self.wal_path}")
+        if self._since_snapshot >= self.compact_every:
+            await self.compact()
+
+    def _record(self, op: str, *args):
+        self._seq += 1
+        self._pending.append(json.dumps({"seq": self._seq, "op": op, "args": args}, ensure_ascii=False) + "\n")
+
+    def _append_pending(self):
+        # While a compaction swaps the WAL, records wait in _pending and go to the fresh file.
+        if not self._pending or self._compacting:
+            return
+        self._wal.write("".join(self._pending))
+        self._wal.flush()
+        n = len(self._pending)
+        self._pending.clear()
+        self.commits_requested += n
+        self._unsynced += n
+        self._since_snapshot += n
+
+    def _lock_wal(self) -> asyncio.Lock:
+        # Created on first use so it binds to the running loop, not the one alive at import time.
+        if self._wal_lock is None:
+            self._wal_lock = asyncio.Lock()
+        return self._wal_lock
+
+    async def _sync(self):
+        async with self._lock_wal():
+            if self._unsynced:
+                self._unsynced = 0
+                await asyncio.to_thread(os.fsync, self._wal.fileno())
+
+    async def _commit(self):
+        if self._replaying:
+            return
+        if self._wal is None:
+            return await super()._commit()
+        self._append_pending()
+        if self.fsync_every and self._unsynced >= self.fsync_every:
+            await self._sync()
+        if self._since_snapshot >= self.compact_every:
+            await self.compact()
+
+    async def flush(self):
+        if self._wal is None:
+            return await super().flush()
+        async with self._lock_wal():
+            self._append_pending()
+        await self._sync()
+
+    def flush_sync(self):
+        if self._wal is None:
+            return super().flush_sync()
+        self._append_pending()
+        os.fsync(self._wal.fileno())
+        self._unsynced = 0
+
+    def _rotate_wal(self, old):
+        old.close()
+        return open(self.wal_path, "w", encoding="utf-8")
+
+    async def compact(self):
+        # The snapshot carries the last applied seq, so a crash before truncation can't double-apply.
+        if self._compacting:
+            return
+        self._compacting = True
+        try:
+            async with self._lock_wal():
+                if self._write_lock is None:
+                    self._write_lock = asyncio.Lock()
+                async with self._write_lock:
+                    self.data["journal_seq"] = self._seq
+                    payload = json.dumps(self.data, indent=2, ensure_ascii=False)
+                    self._dirty = False
+                    await asyncio.to_thread(self._write, payload)
+                    self.commits_written += 1
+                self._wal = await asyncio.to_thread(self._rotate_wal, self._wal)
+                self._unsynced = 0
+                self._since_snapshot = 0
+        finally:
+            self._compacting = False
+        self._append_pending()
+
+    async def set_guild(self, gid, data):
+        self._record("set_guild", gid, data)
+        await super().set_guild(gid, data)
+
+    async def update_guild(self, gid, patch: dict):
+        self._record("update_guild", gid, patch)
+        await super().update_guild(gid, patch)
+
+    async def add_warn(self, gid, uid, warn):
+        self._record("add_warn", gid, uid, warn)
+        return await super().add_warn(gid, uid, warn)
+
+    async def remove_warn(self, gid, uid, warn_id):
+        self._record("remove_warn", gid, uid, warn_id)
+        return await super().remove_warn(gid, uid, warn_id)
+
+    async def add_warns(self, gid, items: list):
+        self._record("add_warns", gid, [list(i) for i in items])
+        await super().add_warns(gid, items)
+
+    async def clear_warns(self, gid, uid):
+        self._record("clear_warns", gid, uid)
+        await super().clear_warns(gid, uid)
+
+    async def add_timer(self, timer: dict):
+        self._record("add_timer", timer)
+        await super().add_timer(timer)
+
+    async def remove_timer(self, timer_id: str):
+        self._record("remove_timer", timer_id)
+        await super().remove_timer(timer_id)
+
+class SQLiteDB(AbstractDB):
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS guilds (gid INTEGER PRIMARY KEY, data TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS warns (gid INTEGER NOT NULL, uid INTEGER NOT NULL, id INTEGER NOT NULL, time TEXT, data TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_warns_gid_uid ON warns (gid, uid)",
+        "CREATE TABLE IF NOT EXISTS audit (gid INTEGER NOT NULL, time REAL NOT NULL, actor_id INTEGER, data TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_audit_gid_time ON audit (gid, time)",
+        "CREATE TABLE IF NOT EXISTS timers (id TEXT PRIMARY KEY, due REAL NOT NULL, data TEXT NOT NULL)",
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = None
+        self._lock = None
+        self._audit_writes = {}
+
+    async def _run(self, fn, *args):
+        # One connection, one query at a time, always off the event loop.
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    def _open(self):
+        self.conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for stmt in self.SCHEMA:
+            self.conn.execute(stmt)
+
+    async def init(self):
+        await self._run(self._open)
+
+    def _get_guild(self, gid):
+        row = self.conn.execute("SELECT data FROM guilds WHERE gid = ?", (int(gid),)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def _put_guild(self, gid, data):
+        self.conn.execute(
+            "INSERT INTO guilds (gid, data) VALUES (?, ?) ON CONFLICT(gid) DO UPDATE SET data = excluded.data",
+            (int(gid), json.dumps(data, ensure_ascii=False)))
+
+    def _update_guild(self, gid, patch):
+        cur = self._get_guild(gid)
+        cur.update(patch)
+        self._put_guild(gid, cur)
+
+    async def get_guild(self, gid):
+        if gid is None:
+            return {}
+        return await self._run(self._get_guild, gid)
+
+    async def set_guild(self, gid, data):
+        await self._run(self._put_guild, gid, data)
+
+    async def update_guild(self, gid, patch: dict):
+        await self._run(self._update_guild, gid, patch)
+
+    async def add_warn(self, gid, uid, warn):
+        await self._run(self.conn.execute, "INSERT INTO warns (gid, uid, id, time, data) VALUES (?, ?, ?, ?, ?)",
+                        (int(gid), int(uid), int(warn["id"]), warn.get("time"), json.dumps(warn, ensure_ascii=False)))
+        return warn
+
+    async def remove_warn(self, gid, uid, warn_id):
+        cur = await self._run(self.conn.execute, "DELETE FROM warns WHERE gid = ? AND uid = ? AND id = ?", (int(gid), int(uid), int(warn_id)))
+        return cur.rowcount > 0
+
+    async def get_warns(self, gid, uid):
+        def work():
+            rows = self.conn.execute("SELECT data FROM warns WHERE gid = ? AND uid = ? ORDER BY rowid", (int(gid), int(uid))).fetchall()
+            return [json.loads(r[0]) for r in rows]
+        return await self._run(work)
+
+    async def add_warns(self, gid, items: list):
+        def work():
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany("INSERT INTO warns (gid, uid, id, time, data) VALUES (?, ?, ?, ?, ?)",
+                                      [(int(gid), int(uid), int(w["id"]), w.get("time"), json.dumps(w, ensure_ascii=False)) for uid, w in items])
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+        await self._run(work)
+
+    async def count_warns(self, gid, uid) -> int:
+        def work():
+            return self.conn.execute("SELECT COUNT(*) FROM warns WHERE gid = ? AND uid = ?", (int(gid), int(uid))).fetchone()[0]
+        return await self._run(work)
+
+    async def page_warns(self, gid, uid, offset: int=0, limit: int=10) -> list:
+        def work():
+            rows = self.conn.execute(
+                "SELECT id, json_extract(data, '$.reason'), json_extract(data, '$.moderator_id'), time, json_extract(data, '$.ts') "
+                "FROM warns WHERE gid = ? AND uid = ? ORDER BY rowid DESC LIMIT ? OFFSET ?", (int(gid), int(uid), int(limit), int(offset))).fetchall()
+            return [{k: v for k, v in zip(WARN_FIELDS, r) if v is not None} for r in rows]
+        return await self._run(work)
+
+    async def clear_warns(self, gid, uid):
+        await self._run(self.conn.execute, "DELETE FROM warns WHERE gid = ? AND uid = ?", (int(gid), int(uid)))
+
+    async def audit(self, gid, entry: dict, retention: Optional[dict]=None):
+        gid = int(gid)
+        entry = {**entry, "time": audit_ts(entry.get("time"))}
+        await self._run(self.conn.execute, "INSERT INTO audit (gid, time, actor_id, data) VALUES (?, ?, ?, ?)",
+                        (gid, entry["time"], entry.get("actor_id"), json.dumps(entry, ensure_ascii=False)))
+        # Retention is enforced in batches so the insert path stays a single indexed write.
+        n = self._audit_writes.get(gid, 0) + 1
+        self._audit_writes[gid] = n
+        if n % AUDIT_PRUNE_EVERY == 0:
+            max_entries, max_age = audit_limits(retention)
+            def prune():
+                if max_age:
+                    self.conn.execute("DELETE FROM audit WHERE gid = ? AND time < ?", (gid, time.time() - max_age))
+                if max_entries:
+                    self.conn.execute("DELETE FROM audit WHERE gid = ? AND time <= (SELECT time FROM audit WHERE gid = ? ORDER BY time DESC LIMIT 1 OFFSET ?)",
+                                      (gid, gid, max_entries))
+            await self._run(prune)
+
+    async def query_audit(self, gid, since: Optional[float]=None, until: Optional[float]=None, actor_id: Optional[int]=None, limit: int=50, retention: Optional[dict]=None):
+        max_entries, max_age = audit_limits(retention)
+        if max_age:
+            since = max(since or 0, time.time() - max_age)
+        sql, params = "SELECT data FROM audit WHERE gid = ? AND time >= ? AND time <= ?", [int(gid), since or 0, until or float("inf")]
+        if actor_id is not None:
+            sql += " AND actor_id = ?"; params.append(int(actor_id))
+        if max_entries:
+            # Rows past max_entries that the batched prune has not removed yet stay hidden.
+            sql += " AND time > COALESCE((SELECT time FROM audit WHERE gid = ? ORDER BY time DESC LIMIT 1 OFFSET ?), -1)"; params += [int(gid), max_entries]
+        sql += " ORDER BY time DESC LIMIT ?"; params.append(int(limit))
+        rows = await self._run(lambda: self.conn.execute(sql, params).fetchall())
+        return [json.loads(r[0]) for r in rows]
+
+    async def add_timer(self, timer: dict):
+        await self._run(self.conn.execute, "INSERT OR REPLACE INTO timers (id, due, data) VALUES (?, ?, ?)",
+                        (timer["id"], float(timer["due"]), json.dumps(timer, ensure_ascii=False)))
+
+    async def remove_timer(self, timer_id: str):
+        await self._run(self.conn.execute, "DELETE FROM timers WHERE id = ?", (timer_id,))
+
+    async def get_timers(self) -> list:
+        rows = await self._run(lambda: self.conn.execute("SELECT data FROM timers").fetchall())
+        return [json.loads(r[0]) for r in rows]
+
+    def flush_sync(self):
+        if self.conn is not None and self.conn.in_transaction:
+            self.conn.commit()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
 class MongoDB(AbstractDB):
     def __init__(self, uri: str, db_name: str):
         self.uri = uri; self.db_name = db_name
         self.client = None; self.db = None
+        self._audit_writes = {}
 
     async def init(self):
         import motor.motor_asyncio
@@ -264,6 +2001,14 @@ class MongoDB(AbstractDB):
         self.db = self.client[self.db_name]
         await self.db.guilds.create_index("gid", unique=True)
         await self.db.warns.create_index([("gid", 1), ("uid", 1)])
+        await self.db.audit.create_index([("gid", 1), ("time", -1)])
+        await self.db.timers.create_index("id", unique=True)
+        await self.db.audit.create_index([("gid", 1), ("actor_id", 1), ("time", -1)])
+        if AUDIT_MAX_AGE_DAYS:
+            try:
+                await self.db.audit.create_index("at", expireAfterSeconds=int(AUDIT_MAX_AGE_DAYS * 86400))
+            except Exception:
+                log.warning("Audit TTL index exists with a different expiry; drop it to apply audit.max_age_days.")
 
     async def get_guild(self, gid):
         doc = await self.db.guilds.find_one({"gid": int(gid)}) or {}
@@ -287,30 +2032,358 @@ class MongoDB(AbstractDB):
         cur = self.db.warns.find({"gid": int(gid), "uid": int(uid)})
         return [w async for w in cur]
 
+    async def add_warns(self, gid, items: list):
+        if items:
+            await self.db.warns.insert_many([{"gid": int(gid), "uid": int(uid), **w} for uid, w in items], ordered=False)
+
+    async def count_warns(self, gid, uid) -> int:
+        return await self.db.warns.count_documents({"gid": int(gid), "uid": int(uid)})
+
+    async def page_warns(self, gid, uid, offset: int=0, limit: int=10) -> list:
+        proj = {"_id": 0, **{k: 1 for k in WARN_FIELDS}}
+        cur = self.db.warns.find({"gid": int(gid), "uid": int(uid)}, proj).sort("_id", -1).skip(int(offset)).limit(int(limit))
+        return await cur.to_list(int(limit))
+
     async def clear_warns(self, gid, uid):
         await self.db.warns.delete_many({"gid": int(gid), "uid": int(uid)})
 
-    async def audit(self, gid, entry: dict):
-        await self.db.audit.insert_one({"gid": int(gid), **entry})
+    async def audit(self, gid, entry: dict, retention: Optional[dict]=None):
+        gid = int(gid)
+        ts = audit_ts(entry.get("time"))
+        await self.db.audit.insert_one({**entry, "gid": gid, "time": ts, "at": datetime.fromtimestamp(ts, timezone.utc)})
+        n = self._audit_writes.get(gid, 0) + 1
+        self._audit_writes[gid] = n
+        if n % AUDIT_PRUNE_EVERY == 0:
+            max_entries, max_age = audit_limits(retention)
+            if max_age:
+                await self.db.audit.delete_many({"gid": gid, "time": {"$lt": time.time() - max_age}})
+            if max_entries:
+                edge = await self.db.audit.find({"gid": gid}, {"time": 1}).sort("time", -1).skip(max_entries).limit(1).to_list(1)
+                if edge:
+                    await self.db.audit.delete_many({"gid": gid, "time": {"$lte": edge[0]["time"]}})
+
+    async def query_audit(self, gid, since: Optional[float]=None, until: Optional[float]=None, actor_id: Optional[int]=None, limit: int=50, retention: Optional[dict]=None):
+        max_entries, max_age = audit_limits(retention)
+        if max_age:
+            since = max(since or 0, time.time() - max_age)
+        edge = None
+        if max_entries:
+            edge = await self.db.audit.find({"gid": int(gid)}, {"time": 1}).sort("time", -1).skip(max_entries).limit(1).to_list(1)
+        q = {"gid": int(gid)}
+        if since is not None or until is not None or edge:
+            q["time"] = {k: v for k, v in (("$gte", since), ("$lte", until), ("$gt", edge[0]["time"] if edge else None)) if v is not None}
+        if actor_id is not None:
+            q["actor_id"] = int(actor_id)
+        cur = self.db.audit.find(q, {"_id": 0, "at": 0}).sort("time", -1).limit(int(limit))
+        return [e async for e in cur]
+
+    async def add_timer(self, timer: dict):
+        await self.db.timers.replace_one({"id": timer["id"]}, timer, upsert=True)
+
+    async def remove_timer(self, timer_id: str):
+        await self.db.timers.delete_one({"id": timer_id})
+
+    async def get_timers(self) -> list:
+        return [t async for t in self.db.timers.find({}, {"_id": 0})]
+
+class CachedDB:
+    # Guild-config cache in front of any AbstractDB; everything else is forwarded to the backend.
+    def __init__(self, inner: AbstractDB, ttl: float = 300, max_size: int = 10000):
+        self.inner = inner
+        self.ttl = ttl
+        self.max_size = max_size
+        self._guilds = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.listeners = []
+
+    def __getattr__(self, name):
+        return getattr(self.inner, name)
+
+    def _store(self, gid: int, data: dict):
+        self._guilds[gid] = (time.monotonic() + self.ttl, data)
+        self._guilds.move_to_end(gid)
+        while len(self._guilds) > self.max_size:
+            self._guilds.popitem(last=False)
+
+    def _changed(self, gid: int):
+        for cb in self.listeners:
+            try: cb(gid)
+            except Exception: log.exception("Guild cache listener failed")
+
+    def invalidate(self, gid=None):
+        # Listeners get the guild id, or None when every guild was dropped.
+        if gid is None:
+            self._guilds.clear()
+            self._changed(None)
+        else:
+            self._guilds.pop(int(gid), None)
+            self._changed(int(gid))
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._guilds),
+                "hit_rate": (self.hits / total) if total else 0.0}
+
+    async def get_guild(self, gid):
+        if gid is None:
+            return await self.inner.get_guild(gid)
+        gid = int(gid)
+        entry = self._guilds.get(gid)
+        # Callers get their own top-level copy, so editing the result can't change the cache.
+        if entry and entry[0] > time.monotonic():
+            self._guilds.move_to_end(gid)
+            self.hits += 1
+            return dict(entry[1])
+        self.misses += 1
+        data = await self.inner.get_guild(gid)
+        self._store(gid, data)
+        return dict(data)
+
+    async def set_guild(self, gid, data):
+        try:
+            await self.inner.set_guild(gid, data)
+        except Exception:
+            self._guilds.pop(int(gid), None)
+            raise
+        self._store(int(gid), data)
+        self._changed(int(gid))
+
+    async def update_guild(self, gid, patch: dict):
+        try:
+            await self.inner.update_guild(gid, patch)
+        except Exception:
+            self._guilds.pop(int(gid), None)
+            raise
+        entry = self._guilds.get(int(gid))
+        if entry:
+            entry[1].update(patch)
+        self._changed(int(gid))
+
+def instrument_db(db: AbstractDB) -> AbstractDB:
+    # Wraps every AbstractDB coroutine on the instance so DB_CALL_SECONDS is labelled per method.
+    def timed(name, fn):
+        async def call(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                DB_CALL_SECONDS.observe(time.perf_counter() - t0, method=name)
+        return call
+    for name, attr in vars(AbstractDB).items():
+        if asyncio.iscoroutinefunction(attr):
+            setattr(db, name, timed(name, getattr(db, name)))
+    return db
+
+def make_db() -> AbstractDB:
+    if DB_MODE == "mongo":
+        return instrument_db(MongoDB(MONGO_URI, MONGO_DB_NAME))
+    if DB_MODE == "sqlite":
+        return instrument_db(SQLiteDB(SQLITE_PATH))
+    if DB_MODE == "journal":
+        return instrument_db(JournalJSONDB(JSON_PATH, fsync_every=JOURNAL_FSYNC_EVERY, compact_every=JOURNAL_COMPACT_EVERY))
+    return instrument_db(JSONDB(JSON_PATH, commit_interval=COMMIT_INTERVAL))
+
+# ---------------- Cluster ----------------
+class ClusterBroker:
+    # Runs in the launcher process: relays JSON lines between workers over a unix socket.
+    # Messages with "to" go to one worker, everything else is broadcast to the other workers.
+    def __init__(self, path: str, workers: int):
+        self.path = path
+        self.workers = workers
+        self.clients = {}
+        self.server = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        cid = None
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    msg = json.loads(line)
+                except ValueError:
+                    continue
+                if msg.get("op") == "hello":
+                    cid = msg.get("from")
+                    self.clients[cid] = writer
+                    writer.write((json.dumps({"op": "welcome", "workers": self.workers}) + "\n").encode())
+                    continue
+                if "to" in msg:
+                    targets = [self.clients[msg["to"]]] if msg["to"] in self.clients else []
+                else:
+                    targets = [w for c, w in self.clients.items() if c != cid]
+                for w in targets:
+                    w.write(line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            if cid is not None and self.clients.get(cid) is writer:
+                del self.clients[cid]
+            writer.close()
+
+class ClusterClient:
+    # Runs in each worker: forwards local guild-settings invalidations to the other workers and
+    # answers/collects cluster-wide stats requests.
+    def __init__(self, bot, path: str, cluster_id: int):
+        self.bot = bot
+        self.path = path
+        self.cluster_id = cluster_id
+        self.workers = 1
+        self._writer = None
+        self._task = None
+        self._pending = {}
+        self._remote = False
+
+    async def connect(self):
+        reader, self._writer = await asyncio.open_unix_connection(self.path)
+        self._send({"op": "hello"})
+        self._task = asyncio.ensure_future(self._read(reader))
+        self.bot.db.listeners.append(self._on_local_change)
+
+    def _send(self, msg: dict):
+        if self._writer is not None and not self._writer.is_closing():
+            self._writer.write((json.dumps({**msg, "from": self.cluster_id}) + "\n").encode())
+
+    def _on_local_change(self, gid: int):
+        if not self._remote:
+            self._send({"op": "invalidate", "gid": gid})
+
+    async def _read(self, reader: asyncio.StreamReader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                continue
+            op = msg.get("op")
+            if op == "welcome":
+                self.workers = int(msg.get("workers", 1))
+            elif op == "invalidate":
+                self._remote = True
+                try:
+                    self.bot.db.invalidate(msg["gid"])
+                finally:
+                    self._remote = False
+            elif op == "stats":
+                self._send({"op": "reply", "rid": msg["rid"], "to": msg["from"], "data": self.bot.local_stats()})
+            elif op == "reply":
+                pending = self._pending.get(msg.get("rid"))
+                if pending:
+                    pending[0].append(msg["data"])
+                    if len(pending[0]) >= self.workers - 1:
+                        pending[1].set()
+        log.warning("Cluster broker connection closed; running standalone.")
+
+    async def gather_stats(self, timeout: float = 2.0) -> list:
+        rid = f"{self.cluster_id}:{time.monotonic_ns()}"
+        replies, done = [], asyncio.Event()
+        self._pending[rid] = (replies, done)
+        try:
+            if self.workers > 1:
+                self._send({"op": "stats", "rid": rid})
+                await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._pending.pop(rid, None)
+        return [self.bot.local_stats()] + replies
+
+async def run_cluster(workers: int):
+    total = int(SHARD_COUNT or workers)
+    workers = max(1, min(workers, total))
+    broker = ClusterBroker(os.path.abspath(CLUSTER_SOCKET), workers)
+    await broker.start()
+    if DB_MODE != "mongo":
+        log.warning("Cluster mode shares state through the database; use database.mode \"mongo\" so workers see each other's writes.")
+
+    async def supervise(idx: int, shard_ids: list):
+        backoff = 1
+        while True:
+            env = {**os.environ, "STUDIO_CLUSTER_ID": str(idx), "STUDIO_CLUSTER_SOCKET": broker.path,
+                   "STUDIO_SHARD_COUNT": str(total), "STUDIO_SHARD_IDS": ",".join(map(str, shard_ids))}
+            log.info(f"Starting worker {idx} with shards {shard_ids}")
+            started = time.monotonic()
+            proc = await asyncio.create_subprocess_exec(sys.executable, os.path.abspath(__file__), env=env)
+            code = await proc.wait()
+            if code == 0:
+                return
+            backoff = 1 if time.monotonic() - started > 60 else min(backoff * 2, 60)
+            log.warning(f"Worker {idx} exited with code {code}; restarting in {backoff}s")
+            await asyncio.sleep(backoff)
+
+    ranges = [list(range(i * total // workers, (i + 1) * total // workers)) for i in range(workers)]
+    await asyncio.gather(*(supervise(i, ids) for i, ids in enumerate(ranges)))
 
 # ---------------- Bot core ----------------
-class TheStudio(commands.Bot):
-    def __init__(self):
+def shard_options() -> dict:
+    if not SHARDING_ENABLED:
+        return {}
+    opts = {}
+    if SHARD_COUNT:
+        opts["shard_count"] = int(SHARD_COUNT)
+        if SHARD_IDS:
+            opts["shard_ids"] = [int(i) for i in SHARD_IDS]
+    return opts
+
+class TheStudio(commands.AutoShardedBot if SHARDING_ENABLED else commands.Bot):
+    def __init__(self, **options):
         super().__init__(
             command_prefix=self.get_prefix,
             intents=intents,
             case_insensitive=True,
-            help_command=None
+            help_command=None,
+            **{**shard_options(), **options}
         )
-        self.db: AbstractDB = MongoDB(MONGO_URI, MONGO_DB_NAME) if DB_MODE == "mongo" else JSONDB(JSON_PATH)
-        self.spam_cache = {}
-        self.chan_del_cache = {}
-        self.afk = {}
-        self.snipes = {}
-        self.editsnipes = {}
+        self.cluster: Optional[ClusterClient] = None
+        self.metrics: Optional[MetricsServer] = None
+        self.profiler: Optional[ProfileSession] = None
+        self.init_state(make_db())
+        METRICS.gauge("studio_rest_queue_depth", "Queued plus in-flight REST actions per lane", lambda: {(k,): v for k, v in self.rest.depth().items()}, ("lane",))
+
+    def init_state(self, backend: AbstractDB):
+        # All per-run subsystems in one place; bench.py calls this to reset the bot between runs.
+        self.db: AbstractDB = CachedDB(backend, ttl=CACHE_TTL, max_size=CACHE_SIZE)
+        self.shard_states = {}
+        self.audit_index = AuditLogIndex()
+        self.rest = RestScheduler()
+        self.punisher = PunishmentExecutor(rest=self.rest)
+        self.modlog = ModLogQueue(rest=self.rest)
+        self.rollouts = {}
+        self._rollouts_resumed = False
+        self.timers = TimerScheduler(self)
+        self.prefix_cache = {}
+        self.dispatch_stats = {"messages": 0, "short_circuited": 0, "commands": 0}
+        self.db.listeners.append(self._forget_prefix)
+        self.db.listeners.append(self.modlog.invalidate)
+        self.afk = BoundedStore(AFK_MAX, AFK_MAX_AGE)
 
     async def setup_hook(self):
+        self.audit_index.self_id = self.user.id
         await self.db.init()
+        if CLUSTER_ID is not None:
+            self.cluster = ClusterClient(self, CLUSTER_SOCKET, int(CLUSTER_ID))
+            try:
+                await self.cluster.connect()
+            except OSError:
+                log.exception("Could not reach the cluster broker; running standalone.")
+                self.cluster = None
+        if METRICS_ENABLED:
+            # Cluster workers each get their own port so they can be scraped separately.
+            self.metrics = MetricsServer(METRICS, METRICS_HOST, METRICS_PORT + int(CLUSTER_ID or 0))
+            try:
+                await self.metrics.start()
+            except OSError:
+                log.exception("Metrics endpoint failed to start")
+                self.metrics = None
         await self.add_cog(HelpCog(self))
         await self.add_cog(General(self))
         await self.add_cog(Moderation(self))
@@ -320,6 +2393,8 @@ class TheStudio(commands.Bot):
         await self.add_cog(Utility(self))
         await self.add_cog(Info(self))
         self.antispam_cleanup.start()
+        await self.timers.load()
+        self.timers.start()
 
         # Slash sync
         if SLASH_GUILD_SYNC_IDS:
@@ -338,20 +2413,127 @@ class TheStudio(commands.Bot):
             except Exception:
                 log.exception("Global slash sync failed")
 
+    async def close(self):
+        await self.modlog.drain()
+        await self.rest.close()
+        try:
+            await self.db.flush()
+        except Exception:
+            log.exception("Final database flush failed")
+        if self.metrics:
+            await self.metrics.close()
+        await super().close()
+
+    async def invoke(self, ctx: commands.Context):
+        t0 = time.perf_counter()
+        prof = self.profiler if ctx.command and self.profiler and self.profiler.matches(ctx.command.qualified_name) else None
+        if prof: prof.enter()
+        try:
+            await super().invoke(ctx)
+        finally:
+            if prof: prof.exit()
+            if ctx.command:
+                COMMAND_SECONDS.observe(time.perf_counter() - t0, command=ctx.command.qualified_name, kind="prefix")
+
+    def _forget_prefix(self, gid: Optional[int]):
+        if gid is None:
+            self.prefix_cache.clear()
+        else:
+            self.prefix_cache.pop(gid, None)
+
     async def get_prefix(self, message: discord.Message):
         if not message.guild:
             return DEFAULT_PREFIX
-        g = await self.db.get_guild(message.guild.id)
-        return g.get("prefix", DEFAULT_PREFIX)
+        prefix = self.prefix_cache.get(message.guild.id)
+        if prefix is None:
+            g = await self.db.get_guild(message.guild.id)
+            prefix = self.prefix_cache[message.guild.id] = g.get("prefix", DEFAULT_PREFIX)
+        return prefix
+
+    async def is_command_candidate(self, message: discord.Message) -> bool:
+        if message.author.bot:
+            return False
+        prefix = self.prefix_cache.get(message.guild.id) if message.guild else DEFAULT_PREFIX
+        if prefix is None:
+            prefix = await self.get_prefix(message)
+        return message.content.startswith(prefix)
+
+    async def audit(self, guild_id: int, action: str, actor_id: Optional[int]=None, target_id: Optional[int]=None, reason: Optional[str]=None):
+        entry = {"time": time.time(), "action": action, "actor_id": actor_id, "target_id": target_id, "reason": reason}
+        try:
+            g = await self.db.get_guild(guild_id)
+            await self.db.audit(guild_id, entry, retention=g.get("audit_retention"))
+        except Exception:
+            log.exception(f"Audit write failed for guild {guild_id}")
+
+    def start_rollout(self, rollout: OverwriteRollout) -> asyncio.Task:
+        key = (rollout.guild.id, rollout.kind)
+        running = self.rollouts.get(key)
+        if running and not running.done():
+            return running
+        if rollout.rest is None:
+            rollout.rest = self.rest
+        task = self.rollouts[key] = asyncio.ensure_future(rollout.run())
+        task.add_done_callback(lambda _: self.rollouts.pop(key, None) if self.rollouts.get(key) is task else None)
+        return task
+
+    async def resume_rollouts(self):
+        # on_ready fires again after every reconnect; checkpoints only need picking up once.
+        if self._rollouts_resumed:
+            return
+        self._rollouts_resumed = True
+        for guild in self.guilds:
+            g = await self.db.get_guild(guild.id)
+            for kind in ROLLOUT_OVERWRITES:
+                cp = g.get(f"rollout_{kind}")
+                if not cp:
+                    continue
+                target = guild.get_role(cp.get("target_id", 0))
+                if target is None:
+                    await self.db.update_guild(guild.id, {f"rollout_{kind}": None})
+                    continue
+                log.info(f"Resuming {kind} overwrite rollout in guild {guild.id} ({len(cp.get('done', []))} channels done)")
+                self.start_rollout(OverwriteRollout(self.db, guild, kind, target, checkpoint=cp))
+
+    def shard(self, guild: Optional[discord.Guild]) -> ShardState:
+        sid = guild.shard_id if guild is not None else 0
+        state = self.shard_states.get(sid)
+        if state is None:
+            state = self.shard_states[sid] = ShardState(sid)
+        return state
+
+    def local_stats(self) -> dict:
+        return {"cluster_id": int(CLUSTER_ID) if CLUSTER_ID is not None else 0, "guilds": len(self.guilds),
+                "users": sum(g.member_count for g in self.guilds if g.member_count), "shards": self.shard_report()}
+
+    def shard_report(self) -> list:
+        guilds = {}
+        for g in self.guilds:
+            guilds[g.shard_id] = guilds.get(g.shard_id, 0) + 1
+        latencies = dict(self.latencies) if SHARDING_ENABLED else {0: self.latency}
+        out = []
+        for sid in sorted(set(latencies) | set(guilds) | set(self.shard_states)):
+            state = self.shard_states.get(sid)
+            lat = latencies.get(sid, float("nan"))
+            out.append({"shard_id": sid, "latency_ms": None if lat != lat else round(lat * 1000),
+                        "guilds": guilds.get(sid, 0), "events": state.events if state else 0,
+                        "rate": state.rate if state else 0.0})
+        return out
 
     @tasks.loop(minutes=1)
     async def antispam_cleanup(self):
-        cutoff = datetime.now(timezone.utc) - timedelta(minutes=5)
-        for cache in (self.spam_cache, self.chan_del_cache):
-            for key in list(cache.keys()):
-                cache[key] = [t for t in cache[key] if t >= cutoff]
-                if not cache[key]:
-                    del cache[key]
+        for state in self.shard_states.values():
+            state.spam.sweep(300)
+            state.chan_del.sweep(300)
+            now = time.monotonic()
+            for gid in [gid for gid, wave in state.joins.items() if wave.idle(now)]:
+                del state.joins[gid]
+            for gid in [gid for gid, index in state.dupes.items() if index.idle(now, 300)]:
+                del state.dupes[gid]
+            state.snipes.sweep()
+            state.editsnipes.sweep()
+            state.tick()
+        self.afk.sweep()
 
     @antispam_cleanup.before_loop
     async def before_cleanup(self):
@@ -367,6 +2549,7 @@ async def on_connect():
 @bot.event
 async def on_ready():
     print(f"{Fore.GREEN if COLOR_ENABLED else ''}[The Studio] on_ready: Logged in as {bot.user} (ID: {bot.user.id}) | guilds={len(bot.guilds)}{Style.RESET_ALL if COLOR_ENABLED else ''}")
+    await bot.resume_rollouts()
 
 @bot.event
 async def on_disconnect():
@@ -380,16 +2563,23 @@ async def on_resumed():
 @bot.event
 async def on_message_delete(message: discord.Message):
     if message.guild and not message.author.bot:
-        bot.snipes[(message.guild.id, message.channel.id)] = (message.author, message.content, datetime.now(timezone.utc))
+        state = bot.shard(message.guild)
+        state.events += 1
+        state.snipes[(message.guild.id, message.channel.id)] = SnipeRecord(message.author, message.content)
 
 @bot.event
 async def on_message_edit(before: discord.Message, after: discord.Message):
     if before.guild and not before.author.bot:
-        bot.editsnipes[(before.guild.id, before.channel.id)] = (before.author, before.content, after.content, datetime.now(timezone.utc))
+        state = bot.shard(before.guild)
+        state.events += 1
+        state.editsnipes[(before.guild.id, before.channel.id)] = SnipeRecord(before.author, before.content, after.content)
 
 @bot.event
 async def on_message(message: discord.Message):
-    if message.guild and message.mentions:
+    bot.dispatch_stats["messages"] += 1
+    if message.guild:
+        bot.shard(message.guild).events += 1
+    if message.guild and message.mentions and bot.afk:
         pinged = [u for u in message.mentions if bot.afk.get(u.id)]
         for u in pinged:
             reason = bot.afk.get(u.id)
@@ -397,8 +2587,18 @@ async def on_message(message: discord.Message):
                 await message.channel.send(embed=ok_embed("AFK", f"{u.mention} is AFK — {ITAL(reason)}", requester=message.author, thumbnail_user=u))
             except Exception:
                 pass
+    # Plain chat never reaches process_commands: one cached-prefix startswith decides.
+    if not await bot.is_command_candidate(message):
+        bot.dispatch_stats["short_circuited"] += 1
+        return
+    bot.dispatch_stats["commands"] += 1
     await bot.process_commands(message)
 
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    # Slash commands are timed from interaction creation, which includes gateway delivery.
+    COMMAND_SECONDS.observe((discord.utils.utcnow() - interaction.created_at).total_seconds(), command=command.qualified_name, kind="slash")
+
 # ---------------- Error handlers ----------------
 @bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
@@ -435,12 +2635,12 @@ class HelpCog(commands.Cog):
 
     def _groups(self) -> dict:
         return {
-            "General": ["ping", "prefix", "help", "sync", "about", "invite", "uptime", "stats"],
-            "Moderation": ["timeout/mute", "removetimeout/unmute", "kick", "ban", "unban", "jail", "unjail", "temprole", "softban"],
-            "Warnings": ["warn", "removewarn", "infractions", "clearwarns"],
-            "Utility": ["purge", "purgeuser", "purgecontains", "purgefiles", "purgebots", "slowmode", "lock", "unlock", "say", "announce", "poll", "nuke", "afk", "remindme", "snipe", "editsnipe"],
+            "General": ["ping", "prefix", "help", "sync", "profile", "memory", "about", "invite", "uptime", "stats"],
+            "Moderation": ["timeout/mute", "removetimeout/unmute", "kick", "ban", "unban", "jail", "unjail", "temprole", "softban", "auditlog"],
+            "Warnings": ["warn", "masswarn", "removewarn", "infractions", "clearwarns"],
+            "Utility": ["purge", "purgeuser", "purgecontains", "purgefiles", "purgebots", "slowmode", "lock", "unlock", "lockdown", "unlockdown", "say", "announce", "poll", "nuke", "afk", "remindme", "snipe", "editsnipe"],
             "Info": ["whois", "avatar", "banner", "serverinfo", "channelinfo", "roleinfo", "emoji", "roles", "permissions"],
-            "Admin Setup": ["setup", "setlog", "setjail", "setwhitelist", "setantinuke", "setinvites", "setnsfwblock"]
+            "Admin Setup": ["setup", "setlog", "setaudit", "setjail", "setwhitelist", "setantinuke", "setinvites", "setnsfwblock"]
         }
 
     def help_embed(self, prefix: str, user: Optional[discord.abc.User]=None) -> discord.Embed:
@@ -490,12 +2690,25 @@ class General(commands.Cog):
 
     @commands.command(name="stats")
     async def stats(self, ctx: commands.Context):
-        users = sum(g.member_count for g in self.bot.guilds if g.member_count)
+        nodes = await self.bot.cluster.gather_stats() if self.bot.cluster else [self.bot.local_stats()]
+        guilds = sum(n["guilds"] for n in nodes)
+        users = sum(n["users"] for n in nodes)
+        cs = self.bot.db.stats()
+        saved = getattr(self.bot.db, "commits_saved", None)
         e = ok_embed("Stats",
-                     f"Guilds: {BOLD(str(len(self.bot.guilds)))}\n"
+                     f"Guilds: {BOLD(str(guilds))}\n"
                      f"Users (approx): {BOLD(str(users))}\n"
-                     f"Latency: {BOLD(str(round(self.bot.latency*1000))+'ms')}",
+                     f"Latency: {BOLD(str(round(self.bot.latency*1000))+'ms')}\n"
+                     + (f"Cluster: {BOLD(str(len(nodes)))} workers reporting\n" if self.bot.cluster else "")
+                     + f"Guild cache: {BOLD(str(cs['hits']))} hits / {BOLD(str(cs['misses']))} misses ({cs['hit_rate']:.0%})"
+                     + (f"\nDB writes coalesced: {BOLD(str(saved))}" if saved is not None else "")
+                     + f"\nMessages: {BOLD(str(self.bot.dispatch_stats['messages']))} • fast-pathed {BOLD(str(self.bot.dispatch_stats['short_circuited']))}",
                      requester=ctx.author, thumbnail_user=ctx.author)
+        shards = sorted((sh for n in nodes for sh in n["shards"]), key=lambda sh: sh["shard_id"])
+        for sh in shards[:24]:
+            e.add_field(name=f"Shard {sh['shard_id']}",
+                        value=f"{sh['latency_ms'] if sh['latency_ms'] is not None else '?'}ms • {sh['guilds']} guilds • {sh['rate']:.1f} ev/s",
+                        inline=True)
         await ctx.reply(embed=e)
 
     @commands.command(name="prefix")
@@ -522,6 +2735,70 @@ class General(commands.Cog):
         except Exception as e:
             await ctx.reply(embed=ok_embed("Sync Failed", str(e), requester=ctx.author, thumbnail_user=ctx.author))
 
+    # profile <seconds> | profile <command|on_event> <invocations> [sort] | profile stop
+    @commands.command(name="profile")
+    @commands.is_owner()
+    async def profile(self, ctx: commands.Context, target: str, count: Optional[int]=None, sort: str="cumulative"):
+        running = self.bot.profiler
+        if target == "stop":
+            if running is None:
+                return await ctx.reply(embed=ok_embed("Profile", "No profiling session is running.", requester=ctx.author, thumbnail_user=ctx.author))
+            return running.finish()
+        if running is not None:
+            return await ctx.reply(embed=ok_embed("Profile", f"A session is already running. Use {CODE('profile stop')} to end it.", requester=ctx.author, thumbnail_user=ctx.author))
+        if target.isdigit():
+            seconds = max(1, min(int(target), 600))
+            session = ProfileSession(None)
+            desc = f"Capturing everything for {BOLD(str(seconds)+'s')}."
+        else:
+            if not target.startswith("on_") and self.bot.get_command(target) is None:
+                return await ctx.reply(embed=ok_embed("Profile", f"Unknown command or listener {CODE(target)}.", requester=ctx.author, thumbnail_user=ctx.author))
+            target = self.bot.get_command(target).qualified_name if self.bot.get_command(target) else target
+            seconds = 600
+            session = ProfileSession(target, max(1, min(count or 10, 10000)))
+            desc = f"Capturing the next {BOLD(str(session.remaining))} invocation(s) of {CODE(target)} (up to {seconds}s)."
+        self.bot.profiler = session
+        if target.startswith("on_"):
+            session.attach(self.bot)
+        await ctx.reply(embed=ok_embed("Profile Started", desc, requester=ctx.author, thumbnail_user=ctx.author))
+        try:
+            await asyncio.wait_for(asyncio.shield(session.done), seconds)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            session.finish()
+            if session.target and session.target.startswith("on_"):
+                session.detach(self.bot)
+            self.bot.profiler = None
+        try:
+            data = session.report(sort)
+        except KeyError:
+            data = session.report()
+        await ctx.reply(embed=ok_embed("Profile Finished", f"{BOLD(str(session.calls))} invocation(s) captured." if session.target else f"Captured {BOLD(str(seconds)+'s')}.", requester=ctx.author, thumbnail_user=ctx.author),
+                        file=discord.File(io.BytesIO(data), filename="profile.txt"))
+
+    @commands.command(name="memory")
+    @commands.is_owner()
+    async def memory(self, ctx: commands.Context):
+        def kb(n): return f"{n/1024:.1f} KiB"
+        states = list(self.bot.shard_states.values())
+        stores = [("Snipes", [st.snipes for st in states]), ("Edit snipes", [st.editsnipes for st in states]), ("AFK", [self.bot.afk])]
+        lines = [f"{UNDER(name)}: {BOLD(str(sum(len(x) for x in group)))} entries • ~{kb(sum(x.nbytes() for x in group))} • evicted {sum(x.evicted for x in group)}"
+                 for name, group in stores]
+        lines.append(f"{UNDER('Rate counters')}: {BOLD(str(sum(len(st.spam) + len(st.chan_del) for st in states)))} keys")
+        lines.append(f"{UNDER('Guild cache')}: {BOLD(str(self.bot.db.stats()['size']))} guilds")
+        lines.append(f"{UNDER('Timers')}: {BOLD(str(len(self.bot.timers)))} pending")
+        ml, rest = self.bot.modlog, self.bot.rest
+        lines.append(f"{UNDER('REST queue')}: " + " • ".join(f"{k} {BOLD(str(v))}" for k, v in rest.depth().items())
+                     + f" • retried {rest.retried} • 429s {rest.rate_limited} • failed {rest.failed}")
+        lines.append(f"{UNDER('Mod-log queue')}: {BOLD(str(ml.pending()))} pending • {ml.embeds} embeds in {ml.sent} messages • dropped {ml.dropped}")
+        try:
+            import resource
+            lines.append(f"{UNDER('Peak RSS')}: {BOLD(kb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024))}")
+        except ImportError:
+            pass
+        await ctx.reply(embed=ok_embed("Memory", "\n".join(lines), requester=ctx.author, thumbnail_user=ctx.author))
+
     @commands.command(name="about")
     async def about(self, ctx: commands.Context):
         desc = f"{BOLD('The Studio')} — Anti‑nuke & Mod bot.\n{UNDER('Author')}: Eryxse\n{UNDER('The Studio')}: {GITHUB_URL}"
@@ -537,13 +2814,16 @@ class General(commands.Cog):
 class Moderation(commands.Cog):
     def __init__(self, bot: TheStudio):
         self.bot = bot
+        bot.timers.register("unjail", self._timer_unjail)
+        bot.timers.register("temprole", self._timer_temprole)
 
     @commands.command(name="timeout", aliases=["mute"])
     @commands.has_guild_permissions(moderate_members=True)
     async def timeout_cmd(self, ctx: commands.Context, member: discord.Member, duration: Optional[str]=None, *, reason: Optional[str]=None):
         secs = parse_duration(duration, 300)
         until = datetime.now(timezone.utc) + timedelta(seconds=secs)
-        await member.timeout(until, reason=reason or f"Timeout by {ctx.author}")
+        await self.bot.rest.run(LANE_MODERATION, f"member:{ctx.guild.id}", partial(member.timeout, until, reason=reason or f"Timeout by {ctx.author}"))
+        await self.bot.audit(ctx.guild.id, "timeout", ctx.author.id, member.id, reason)
         await ctx.reply(embed=ok_embed("Timed Out", f"{member.mention} for {BOLD(human_timedelta(timedelta(seconds=secs)))}", requester=ctx.author, thumbnail_user=ctx.author))
 
     @app_commands.command(name="timeout", description="Timeout/mute a member temporarily.")
@@ -551,55 +2831,62 @@ class Moderation(commands.Cog):
     async def timeout_slash(self, interaction: discord.Interaction, member: discord.Member, duration: Optional[str]=None, reason: Optional[str]=None):
         secs = parse_duration(duration, 300)
         until = datetime.now(timezone.utc) + timedelta(seconds=secs)
-        await member.timeout(until, reason=reason or f"Timeout by {interaction.user}")
+        await self.bot.rest.run(LANE_MODERATION, f"member:{interaction.guild.id}", partial(member.timeout, until, reason=reason or f"Timeout by {interaction.user}"))
+        await self.bot.audit(interaction.guild_id, "timeout", interaction.user.id, member.id, reason)
         await interaction.response.send_message(embed=ok_embed("Timed Out", f"{member.mention} for {BOLD(human_timedelta(timedelta(seconds=secs)))}", requester=interaction.user, thumbnail_user=interaction.user))
 
     @commands.command(name="removetimeout", aliases=["unmute"])
     @commands.has_guild_permissions(moderate_members=True)
     async def removetimeout(self, ctx: commands.Context, member: discord.Member, *, reason: Optional[str]=None):
-        await member.timeout(None, reason=reason or f"Remove timeout by {ctx.author}")
+        await self.bot.rest.run(LANE_MODERATION, f"member:{ctx.guild.id}", partial(member.timeout, None, reason=reason or f"Remove timeout by {ctx.author}"))
         await ctx.reply(embed=ok_embed("Timeout Removed", f"{member.mention} is free.", requester=ctx.author, thumbnail_user=ctx.author))
 
     @app_commands.command(name="removetimeout", description="Remove timeout from a member.")
     @app_commands.check(app_mod_or_admin)
     async def removetimeout_slash(self, interaction: discord.Interaction, member: discord.Member, reason: Optional[str]=None):
-        await member.timeout(None, reason=reason or f"Remove timeout by {interaction.user}")
+        await self.bot.rest.run(LANE_MODERATION, f"member:{interaction.guild.id}", partial(member.timeout, None, reason=reason or f"Remove timeout by {interaction.user}"))
         await interaction.response.send_message(embed=ok_embed("Timeout Removed", f"{member.mention} is free.", requester=interaction.user, thumbnail_user=interaction.user))
 
     @commands.command(name="kick")
     @commands.has_guild_permissions(kick_members=True)
     async def kick(self, ctx: commands.Context, member: discord.Member, *, reason: Optional[str]=None):
-        await member.kick(reason=reason or f"Kicked by {ctx.author}")
+        await self.bot.rest.run(LANE_MODERATION, f"member:{ctx.guild.id}", partial(member.kick, reason=reason or f"Kicked by {ctx.author}"))
+        await self.bot.audit(ctx.guild.id, "kick", ctx.author.id, member.id, reason)
         await ctx.reply(embed=ok_embed("Kicked", f"{member}", requester=ctx.author, thumbnail_user=ctx.author))
 
     @app_commands.command(name="kick", description="Kick a member.")
     @app_commands.check(app_mod_or_admin)
     async def kick_slash(self, interaction: discord.Interaction, member: discord.Member, reason: Optional[str]=None):
-        await member.kick(reason=reason or f"Kicked by {interaction.user}")
+        await self.bot.rest.run(LANE_MODERATION, f"member:{interaction.guild.id}", partial(member.kick, reason=reason or f"Kicked by {interaction.user}"))
+        await self.bot.audit(interaction.guild_id, "kick", interaction.user.id, member.id, reason)
         await interaction.response.send_message(embed=ok_embed("Kicked", f"{member}", requester=interaction.user, thumbnail_user=interaction.user))
 
     @commands.command(name="ban")
     @commands.has_guild_permissions(ban_members=True)
     async def ban(self, ctx: commands.Context, member: discord.Member, *, reason: Optional[str]=None):
-        await member.ban(reason=reason or f"Banned by {ctx.author}")
+        await self.bot.rest.run(LANE_MODERATION, f"ban:{ctx.guild.id}", partial(member.ban, reason=reason or f"Banned by {ctx.author}"))
+        await self.bot.audit(ctx.guild.id, "ban", ctx.author.id, member.id, reason)
         await ctx.reply(embed=ok_embed("Banned", f"{member}", requester=ctx.author, thumbnail_user=ctx.author))
 
     @app_commands.command(name="ban", description="Ban a member.")
     @app_commands.check(app_mod_or_admin)
     async def ban_slash(self, interaction: discord.Interaction, member: discord.Member, reason: Optional[str]=None):
-        await member.ban(reason=reason or f"Banned by {interaction.user}")
+        await self.bot.rest.run(LANE_MODERATION, f"ban:{interaction.guild.id}", partial(member.ban, reason=reason or f"Banned by {interaction.user}"))
+        await self.bot.audit(interaction.guild_id, "ban", interaction.user.id, member.id, reason)
         await interaction.response.send_message(embed=ok_embed("Banned", f"{member}", requester=interaction.user, thumbnail_user=interaction.user))
 
     @commands.command(name="unban")
     @commands.has_guild_permissions(ban_members=True)
     async def unban(self, ctx: commands.Context, user: discord.User, *, reason: Optional[str]=None):
-        await ctx.guild.unban(user, reason=reason or f"Unban by {ctx.author}")
+        await self.bot.rest.run(LANE_MODERATION, f"ban:{ctx.guild.id}", partial(ctx.guild.unban, user, reason=reason or f"Unban by {ctx.author}"))
+        await self.bot.audit(ctx.guild.id, "unban", ctx.author.id, user.id, reason)
         await ctx.reply(embed=ok_embed("Unbanned", f"{user}", requester=ctx.author, thumbnail_user=ctx.author))
 
     @app_commands.command(name="unban", description="Unban a user.")
     @app_commands.check(app_mod_or_admin)
     async def unban_slash(self, interaction: discord.Interaction, user: discord.User, reason: Optional[str]=None):
-        await interaction.guild.unban(user, reason=reason or f"Unban by {interaction.user}")
+        await self.bot.rest.run(LANE_MODERATION, f"ban:{interaction.guild.id}", partial(interaction.guild.unban, user, reason=reason or f"Unban by {interaction.user}"))
+        await self.bot.audit(interaction.guild_id, "unban", interaction.user.id, user.id, reason)
         await interaction.response.send_message(embed=ok_embed("Unbanned", f"{user}", requester=interaction.user, thumbnail_user=interaction.user))
 
     async def ensure_jail_role(self, guild: discord.Guild) -> discord.Role:
@@ -610,20 +2897,11 @@ class Moderation(commands.Cog):
             return role
         role = await guild.create_role(name="Jail", reason="The Studio jail role")
         await self.bot.db.update_guild(guild.id, {"jail_role_id": role.id})
-        for ch in guild.channels:
-            try:
-                ow = ch.overwrites or {}
-                ow[role] = discord.PermissionOverwrite(
-                    view_channel=False, send_messages=False, speak=False,
-                    send_messages_in_threads=False, add_reactions=False
-                )
-                await ch.edit(overwrites=ow)
-            except Exception:
-                pass
+        await self.bot.start_rollout(OverwriteRollout(self.bot.db, guild, "jail", role))
         jail_ch = discord.utils.get(guild.text_channels, name="jail")
         if not jail_ch:
             jail_ch = await guild.create_text_channel("jail", reason="The Studio jail channel")
-            await jail_ch.set_permissions(role, view_channel=True, send_messages=True)
+            await self.bot.rest.run(LANE_MODERATION, f"channel:{jail_ch.id}", partial(jail_ch.set_permissions, role, view_channel=True, send_messages=True))
         return role
 
     @commands.command(name="jail")
@@ -634,71 +2912,164 @@ class Moderation(commands.Cog):
         roles_to_remove = [r for r in member.roles if not r.is_default() and r != jail_role]
         store = {"roles": [r.id for r in roles_to_remove], "until": (datetime.now(timezone.utc) + timedelta(seconds=secs)).timestamp()}
         g = await self.bot.db.get_guild(ctx.guild.id)
-        jailed = g.get("jailed", {}); jailed[str(member.id)] = store
+        jailed = {**g.get("jailed", {}), str(member.id): store}
         await self.bot.db.update_guild(ctx.guild.id, {"jailed": jailed})
-        await member.edit(roles=[r for r in member.roles if r not in roles_to_remove] + [jail_role], reason=reason or f"Jailed by {ctx.author}")
+        await self.bot.timers.schedule(f"unjail:{ctx.guild.id}:{member.id}", "unjail", store["until"], gid=ctx.guild.id, uid=member.id)
+        await self.bot.rest.run(LANE_MODERATION, f"member:{ctx.guild.id}", partial(member.edit, roles=[r for r in member.roles if r not in roles_to_remove] + [jail_role], reason=reason or f"Jailed by {ctx.author}"))
+        await self.bot.audit(ctx.guild.id, "jail", ctx.author.id, member.id, reason)
         await ctx.reply(embed=ok_embed("Jailed", f"{member.mention} for {BOLD(human_timedelta(timedelta(seconds=secs)))}", requester=ctx.author, thumbnail_user=ctx.author))
 
-    @commands.command(name="unjail")
-    @commands.has_guild_permissions(manage_roles=True, moderate_members=True)
-    async def unjail(self, ctx: commands.Context, member: discord.Member):
-        g = await self.bot.db.get_guild(ctx.guild.id)
-        jailed = g.get("jailed", {})
-        info = jailed.pop(str(member.id), None)
+    async def release_jail(self, guild: discord.Guild, member_id: int) -> bool:
+        g = await self.bot.db.get_guild(guild.id)
+        jailed = dict(g.get("jailed", {}))
+        info = jailed.pop(str(member_id), None)
         if not info:
-            return await ctx.reply(embed=ok_embed("Not Jailed", f"{member.mention} isn’t jailed.", requester=ctx.author, thumbnail_user=ctx.author))
-        await self.bot.db.update_guild(ctx.guild.id, {"jailed": jailed})
+            return False
+        await self.bot.db.update_guild(guild.id, {"jailed": jailed})
+        await self.bot.timers.cancel(f"unjail:{guild.id}:{member_id}")
+        member = guild.get_member(member_id)
+        if member is None:
+            return True
         jr_id = g.get("jail_role_id")
         if jr_id:
-            jr = ctx.guild.get_role(jr_id)
+            jr = guild.get_role(jr_id)
             if jr and jr in member.roles:
-                await member.remove_roles(jr, reason="Unjail")
+                await self.bot.rest.run(LANE_MODERATION, f"member:{guild.id}", partial(member.remove_roles, jr, reason="Unjail"))
         role_ids = info.get("roles", [])
-        roles = [ctx.guild.get_role(rid) for rid in role_ids if ctx.guild.get_role(rid)]
+        roles = [guild.get_role(rid) for rid in role_ids if guild.get_role(rid)]
         if roles:
-            try: await member.add_roles(*roles, reason="Restore roles after jail")
+            try: await self.bot.rest.run(LANE_MODERATION, f"member:{guild.id}", partial(member.add_roles, *roles, reason="Restore roles after jail"))
             except discord.Forbidden: pass
+        return True
+
+    async def _timer_unjail(self, timer: dict):
+        guild = self.bot.get_guild(timer["gid"])
+        if guild and await self.release_jail(guild, timer["uid"]):
+            await self.bot.audit(guild.id, "unjail", None, timer["uid"], "Jail expired")
+
+    async def _timer_temprole(self, timer: dict):
+        guild = self.bot.get_guild(timer["gid"])
+        member = guild.get_member(timer["uid"]) if guild else None
+        role = guild.get_role(timer["role_id"]) if guild else None
+        if member and role and role in member.roles:
+            try:
+                await self.bot.rest.run(LANE_MODERATION, f"member:{guild.id}", partial(member.remove_roles, role, reason="Temp role expired"))
+            except discord.Forbidden:
+                pass
+
+    @commands.command(name="unjail")
+    @commands.has_guild_permissions(manage_roles=True, moderate_members=True)
+    async def unjail(self, ctx: commands.Context, member: discord.Member):
+        if not await self.release_jail(ctx.guild, member.id):
+            return await ctx.reply(embed=ok_embed("Not Jailed", f"{member.mention} isn’t jailed.", requester=ctx.author, thumbnail_user=ctx.author))
+        await self.bot.audit(ctx.guild.id, "unjail", ctx.author.id, member.id)
         await ctx.reply(embed=ok_embed("Unjailed", f"{member.mention} restored.", requester=ctx.author, thumbnail_user=ctx.author))
 
     @commands.command(name="temprole")
     @commands.has_guild_permissions(manage_roles=True)
     async def temprole(self, ctx: commands.Context, member: discord.Member, role: discord.Role, duration: Optional[str]=None, *, reason: Optional[str]=None):
         secs = parse_duration(duration, 600)
-        await member.add_roles(role, reason=reason or f"Temp role by {ctx.author}")
+        await self.bot.rest.run(LANE_MODERATION, f"member:{ctx.guild.id}", partial(member.add_roles, role, reason=reason or f"Temp role by {ctx.author}"))
+        await self.bot.timers.schedule(f"temprole:{ctx.guild.id}:{member.id}:{role.id}", "temprole", time.time() + secs, gid=ctx.guild.id, uid=member.id, role_id=role.id)
         await ctx.reply(embed=ok_embed("Temp Role", f"Gave {role.mention} to {member.mention} for {BOLD(human_timedelta(timedelta(seconds=secs)))}", requester=ctx.author, thumbnail_user=ctx.author))
-        await asyncio.sleep(secs)
-        try:
-            await member.remove_roles(role, reason="Temp role expired")
-        except discord.Forbidden:
-            pass
+
+    @commands.command(name="auditlog")
+    @mod_or_admin()
+    async def auditlog(self, ctx: commands.Context, member: Optional[discord.Member]=None, since: Optional[str]=None):
+        secs = parse_duration(since, 7*86400)
+        g = await self.bot.db.get_guild(ctx.guild.id)
+        entries = await self.bot.db.query_audit(ctx.guild.id, since=time.time() - secs, actor_id=member.id if member else None, limit=20, retention=g.get("audit_retention"))
+        if not entries:
+            return await ctx.reply(embed=ok_embed("Audit Log", "No entries in that range.", requester=ctx.author, thumbnail_user=ctx.author))
+        lines = [f"<t:{int(e['time'])}:R> • {CODE(e.get('action', '?'))} • {'<@'+str(e['actor_id'])+'>' if e.get('actor_id') else 'The Studio'}"
+                 + (f" → <@{e['target_id']}>" if e.get('target_id') else "") + (f" • {ITAL(e['reason'])}" if e.get('reason') else "")
+                 for e in entries]
+        await ctx.reply(embed=ok_embed(f"Audit Log — last {human_timedelta(timedelta(seconds=secs))}", "\n".join(lines), requester=ctx.author, thumbnail_user=ctx.author))
 
 # ---------------- Warnings ----------------
+class InfractionsView(discord.ui.View):
+    PAGE_SIZE = 10
+
+    def __init__(self, db, guild_id: int, member: discord.Member, requester: discord.abc.User):
+        super().__init__(timeout=120)
+        self.db = db
+        self.guild_id = guild_id
+        self.member = member
+        self.requester = requester
+        self.page = 0
+        self.total = 0
+        self.warns = []
+        self.message = None
+
+    @property
+    def pages(self) -> int:
+        return max(1, -(-self.total // self.PAGE_SIZE))
+
+    async def load(self, page: int) -> int:
+        # Count first so an out-of-range page is clamped before it costs a query.
+        self.total = await self.db.count_warns(self.guild_id, self.member.id)
+        self.page = max(0, min(page, self.pages - 1))
+        self.warns = await self.db.page_warns(self.guild_id, self.member.id, offset=self.page * self.PAGE_SIZE, limit=self.PAGE_SIZE) if self.total else []
+        self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages - 1
+        return self.total
+
+    def embed(self) -> discord.Embed:
+        lines = [f"{CODE('#'+str(w['id']))} • {ITAL(w.get('reason', 'No reason'))} • <@{w.get('moderator_id')}> • <t:{warn_ts(w)}:R>" for w in self.warns]
+        e = ok_embed(f"Infractions for {self.member} — {self.total} total", "\n".join(lines) or "No warnings on this page.", requester=self.requester, thumbnail_user=self.member)
+        e.set_author(name=f"Page {self.page + 1}/{self.pages}")
+        return e
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.requester.id
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        await self.load(page)
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+    async def on_timeout(self):
+        if self.message:
+            try: await self.message.edit(view=None)
+            except discord.HTTPException: pass
+
 class Warns(commands.Cog):
     def __init__(self, bot: TheStudio):
         self.bot = bot
 
     def _new_warn(self, moderator: discord.abc.User, reason: Optional[str]):
-        return {"id": random.randint(100000, 999999), "moderator_id": moderator.id, "reason": reason or "No reason", "time": datetime.now(timezone.utc).isoformat()}
+        now = datetime.now(timezone.utc)
+        return {"id": random.randint(100000, 999999), "moderator_id": moderator.id, "reason": reason or "No reason", "time": now.isoformat(), "ts": now.timestamp()}
 
-    async def log_and_dm(self, guild: discord.Guild, target: discord.Member, moderator: discord.abc.User, warn_id: int, reason: str):
-        # DM user
+    async def dm_warn(self, guild: discord.Guild, target: discord.Member, moderator: discord.abc.User, warn_id: int, reason: str):
         try:
             dm = await target.create_dm()
             await dm.send(embed=ok_embed("You were warned", f"Server: {BOLD(guild.name)}\nBy: {BOLD(str(moderator))}\nReason: {ITAL(reason)}\nID: {CODE(str(warn_id))}", requester=moderator, thumbnail_user=moderator))
         except Exception:
             pass
+
+    async def log_and_dm(self, guild: discord.Guild, target: discord.Member, moderator: discord.abc.User, warn_id: int, reason: str):
+        await self.bot.rest.run(LANE_LOGGING, f"dm:{target.id}", partial(self.dm_warn, guild, target, moderator, warn_id, reason))
         # Log in channel
         g = await self.bot.db.get_guild(guild.id)
         ch_id = g.get("log_channel_id")
         ch = guild.get_channel(ch_id) if ch_id else None
         if isinstance(ch, discord.TextChannel):
-            await ch.send(embed=ok_embed("Warn Issued", f"{target.mention} warned by {BOLD(str(moderator))}\nReason: {ITAL(reason)}\nID: {CODE(str(warn_id))}", requester=moderator, thumbnail_user=target))
+            await self.bot.rest.run(LANE_LOGGING, f"channel:{ch.id}", partial(ch.send, embed=ok_embed("Warn Issued", f"{target.mention} warned by {BOLD(str(moderator))}\nReason: {ITAL(reason)}\nID: {CODE(str(warn_id))}", requester=moderator, thumbnail_user=target)), idempotent=False)
 
     @commands.command(name="warn")
     @commands.has_guild_permissions(moderate_members=True)
     async def warn(self, ctx: commands.Context, member: discord.Member, *, reason: Optional[str]=None):
         warn = self._new_warn(ctx.author, reason)
         await self.bot.db.add_warn(ctx.guild.id, member.id, warn)
+        await self.bot.audit(ctx.guild.id, "warn", ctx.author.id, member.id, warn['reason'])
         await self.log_and_dm(ctx.guild, member, ctx.author, warn['id'], warn['reason'])
         await ctx.reply(embed=ok_embed("Warned", f"{member.mention} warned {CODE('#'+str(warn['id']))}\nReason: {ITAL(warn['reason'])}", requester=ctx.author, thumbnail_user=member))
 
@@ -707,6 +3078,7 @@ class Warns(commands.Cog):
     async def warn_slash(self, interaction: discord.Interaction, member: discord.Member, reason: Optional[str]=None):
         warn = self._new_warn(interaction.user, reason)
         await self.bot.db.add_warn(interaction.guild_id, member.id, warn)
+        await self.bot.audit(interaction.guild_id, "warn", interaction.user.id, member.id, warn['reason'])
         await self.log_and_dm(interaction.guild, member, interaction.user, warn['id'], warn['reason'])
         await interaction.response.send_message(embed=ok_embed("Warned", f"{member.mention} warned {CODE('#'+str(warn['id']))}\nReason: {ITAL(warn['reason'])}", requester=interaction.user, thumbnail_user=member))
 
@@ -722,152 +3094,307 @@ class Warns(commands.Cog):
         ok = await self.bot.db.remove_warn(interaction.guild_id, member.id, warn_id)
         await interaction.response.send_message(embed=ok_embed("Remove Warn", f"{member.mention} warn {CODE('#'+str(warn_id))} {'removed' if ok else 'not found'}.", requester=interaction.user, thumbnail_user=member))
 
+    @commands.command(name="masswarn")
+    @commands.has_guild_permissions(moderate_members=True)
+    async def masswarn(self, ctx: commands.Context, members: commands.Greedy[discord.Member], *, reason: Optional[str]=None):
+        members = list({m.id: m for m in members if not m.bot}.values())
+        if not members:
+            return await ctx.reply(embed=ok_embed("Mass Warn", "Mention at least one member.", requester=ctx.author, thumbnail_user=ctx.author))
+        items = [(m.id, self._new_warn(ctx.author, reason)) for m in members]
+        await self.bot.db.add_warns(ctx.guild.id, items)
+        await asyncio.gather(*(self.bot.audit(ctx.guild.id, "warn", ctx.author.id, uid, w["reason"]) for uid, w in items))
+        g = await self.bot.db.get_guild(ctx.guild.id)
+        ch = ctx.guild.get_channel(g.get("log_channel_id")) if g.get("log_channel_id") else None
+        summary = f"{BOLD(str(len(items)))} members warned by {BOLD(str(ctx.author))}\nReason: {ITAL(items[0][1]['reason'])}"
+        if isinstance(ch, discord.TextChannel):
+            await self.bot.rest.run(LANE_LOGGING, f"channel:{ch.id}", partial(ch.send, embed=ok_embed("Mass Warn Issued", summary, requester=ctx.author, thumbnail_user=ctx.author)), idempotent=False)
+        await ctx.reply(embed=ok_embed("Mass Warned", summary, requester=ctx.author, thumbnail_user=ctx.author))
+        # Same DM as a single warn; the logging lane keeps a large batch from crowding out moderation calls.
+        await asyncio.gather(*(self.bot.rest.run(LANE_LOGGING, f"dm:{m.id}", partial(self.dm_warn, ctx.guild, m, ctx.author, w["id"], w["reason"]))
+                               for m, (_, w) in zip(members, items)))
+
     @commands.command(name="infractions")
     async def infractions(self, ctx: commands.Context, member: Optional[discord.Member]=None):
         member = member or ctx.author
-        warns = await self.bot.db.get_warns(ctx.guild.id, member.id)
-        if not warns:
+        view = InfractionsView(self.bot.db, ctx.guild.id, member, ctx.author)
+        if not await view.load(0):
             return await ctx.reply(embed=ok_embed("Infractions", f"{member.mention} has {BOLD('0')} warnings.", requester=ctx.author, thumbnail_user=member))
-        lines = [f"{CODE('#'+str(w['id']))} • {ITAL(w['reason'])} • <@{w['moderator_id']}> • <t:{int(datetime.fromisoformat(w['time']).timestamp())}:R>" for w in warns]
-        await ctx.reply(embed=ok_embed(f"Infractions for {member}", "\n".join(lines[:20]), requester=ctx.author, thumbnail_user=member))
+        view.message = await ctx.reply(embed=view.embed(), view=view if view.pages > 1 else None)
 
     @commands.command(name="clearwarns")
     @commands.has_guild_permissions(moderate_members=True)
     async def clearwarns(self, ctx: commands.Context, member: discord.Member):
         await self.bot.db.clear_warns(ctx.guild.id, member.id)
+        await self.bot.audit(ctx.guild.id, "clearwarns", ctx.author.id, member.id)
         await ctx.reply(embed=ok_embed("Cleared Warns", f"All warnings cleared for {member.mention}", requester=ctx.author, thumbnail_user=member))
 
 # ---------------- Anti-Nuke ----------------
 class AntiNuke(commands.Cog):
     def __init__(self, bot: TheStudio):
         self.bot = bot
+        self._pipelines = {}  # guild id -> compiled message filters, rebuilt when settings change
+        bot.db.listeners.append(self._invalidate)
+
+    def cog_unload(self):
+        if self._invalidate in self.bot.db.listeners:
+            self.bot.db.listeners.remove(self._invalidate)
+
+    def _invalidate(self, guild_id: Optional[int]):
+        if guild_id is None:
+            self._pipelines.clear()
+        else:
+            self._pipelines.pop(guild_id, None)
 
     async def get_settings(self, guild_id: int) -> dict:
         g = await self.bot.db.get_guild(guild_id)
         s = g.get("antinuke", {})
         out = {**ANTI_DEFAULTS, **s}
-        out.setdefault("whitelist_ids", [])
+        out["whitelist_ids"] = set(g.get("whitelist_ids", []))
         out["log_channel_id"] = g.get("log_channel_id")
         return out
 
-    def _log_channel(self, guild: discord.Guild, settings: dict) -> Optional[discord.TextChannel]:
-        ch_id = settings.get("log_channel_id")
-        if ch_id:
-            ch = guild.get_channel(ch_id)
-            if isinstance(ch, discord.TextChannel): return ch
-        for name in ("mod-log", "logs", "The Studio-logs"):
-            ch = discord.utils.get(guild.text_channels, name=name)
-            if ch: return ch
-        return None
+    def _log(self, guild: discord.Guild, settings: dict, embed: discord.Embed, alert: bool = False):
+        # Alerts about containment actions are never dropped when the mod-log queue overflows.
+        self.bot.modlog.post(guild, embed, settings.get("log_channel_id"), priority=alert)
 
     async def _punish(self, guild: discord.Guild, offender: discord.Member, settings: dict, reason: str, actor: Optional[discord.Member]=None):
         if offender is None:
             return
         secs = int(settings.get("timeout_seconds", 60))
-        try:
-            until = datetime.now(timezone.utc) + timedelta(seconds=secs)
-            await offender.timeout(until, reason=f"Anti-Nuke: {reason}")
-        except discord.Forbidden:
-            pass
-        if settings.get("auto_revoke_dangerous_perms", True):
-            try:
-                for role in offender.roles:
-                    if role.is_default(): continue
-                    p = role.permissions
-                    if p.administrator or p.manage_guild or p.manage_roles:
-                        await offender.remove_roles(role, reason="The Studio revoke dangerous perms")
-            except discord.Forbidden:
-                pass
-        ch = self._log_channel(guild, settings)
-        if ch:
-            await ch.send(embed=ok_embed("Anti-Nuke Triggered", f"Offender: {offender.mention}\nReason: {ITAL(reason)}\nAction: Timeout {CODE(str(secs)+'s')}", requester=actor or offender, thumbnail_user=offender))
+        t0 = time.perf_counter()
+        stripped = await self.bot.punisher.punish(offender, secs, settings.get("auto_revoke_dangerous_perms", True), f"Anti-Nuke: {reason}")
+        if stripped is None:
+            return
+        PUNISH_SECONDS.observe(time.perf_counter() - t0)
+        action = f"Timeout {CODE(str(secs)+'s')}" + (f", removed {', '.join(r.mention for r in stripped)}" if stripped else "")
+        self._log(guild, settings, ok_embed("Anti-Nuke Triggered", f"Offender: {offender.mention}\nReason: {ITAL(reason)}\nAction: {action}", requester=actor or offender, thumbnail_user=offender), alert=True)
+        await self.bot.audit(guild.id, "antinuke", None, offender.id, reason)
+
+    # Each filter returns True when it handled the message and later filters should be skipped.
+    async def _filter_invites(self, settings: dict, message: discord.Message) -> bool:
+        if "/" not in message.content or not INVITE_REGEX.search(message.content):
+            return False
+        FILTER_HITS.inc(filter="invites")
+        try: await self.bot.rest.run(LANE_MODERATION, f"channel:{message.channel.id}", message.delete)
+        except (discord.Forbidden, discord.NotFound): pass
+        self._log(message.guild, settings, ok_embed("Invite Blocked", f"{message.author.mention} in {message.channel.mention}", requester=message.author, thumbnail_user=message.author))
+        return True
+
+    async def _filter_images(self, settings: dict, message: discord.Message) -> bool:
+        if not message.attachments or getattr(message.channel, "is_nsfw", lambda: False)():
+            return False
+        if any(att.content_type and att.content_type.startswith("image/") for att in message.attachments):
+            FILTER_HITS.inc(filter="images")
+            try: await self.bot.rest.run(LANE_MODERATION, f"channel:{message.channel.id}", message.delete)
+            except (discord.Forbidden, discord.NotFound): pass
+            self._log(message.guild, settings, ok_embed("Image Blocked", f"{message.author.mention} in {message.channel.mention}", requester=message.author, thumbnail_user=message.author))
+        return False
+
+    async def _filter_spam(self, settings: dict, thr: int, win: int, message: discord.Message) -> bool:
+        key = (message.guild.id, message.author.id)
+        spam = self.bot.shard(message.guild).spam
+        n = spam.hit(key, win, cap=thr)
+        if n < thr:
+            return False
+        FILTER_HITS.inc(filter="spam")
+        try: await self.bot.rest.run(LANE_MODERATION, f"channel:{message.channel.id}", message.delete)
+        except (discord.Forbidden, discord.NotFound): pass
+        spam.reset(key)
+        await self._punish(message.guild, message.author, settings, f"Spam: {n}/{thr} in {win}s", actor=message.author)
+        return True
+
+    async def _filter_duplicates(self, settings: dict, thr: int, win: int, min_len: int, message: discord.Message) -> bool:
+        # Whitelisted members are exempt: their copies are neither counted nor removed.
+        if message.author.id in settings["whitelist_ids"]:
+            return False
+        fp = content_fingerprint(message.content, min_len)
+        if fp is None:
+            return False
+        guild = message.guild
+        dupes = self.bot.shard(guild).dupes
+        index = dupes.get(guild.id)
+        if index is None:
+            index = dupes[guild.id] = DuplicateIndex()
+        now = time.monotonic()
+        copies = index.add(now, fp, (message.channel.id, message.id, message.author.id), win)
+        late = index.flagged.get(fp, 0) > now
+        if not late and len(copies) < thr:
+            return False
+        batch = index.take(fp)
+        index.flag(fp, now + win, now)
+        FILTER_HITS.inc(filter="duplicates")
+        by_channel = {}
+        for cid, mid, _ in batch:
+            by_channel.setdefault(cid, []).append(discord.Object(mid))
+        authors = {aid for _, _, aid in batch}
+        if not late:
+            self._log(guild, settings, ok_embed("Duplicate Spam Detected", f"{BOLD(str(len(batch)))} copies from {BOLD(str(len(authors)))} accounts across {BOLD(str(len(by_channel)))} channels within {BOLD(str(win)+'s')}.\nSample: {CODE(message.content[:80])}"), alert=True)
+        jobs = []
+        for cid, objs in by_channel.items():
+            channel = message.channel if cid == message.channel.id else guild.get_channel_or_thread(cid)
+            if channel is None:
+                continue
+            for i in range(0, len(objs), 100):
+                jobs.append(self.bot.rest.run(LANE_MODERATION, f"channel:{cid}", partial(channel.delete_messages, objs[i:i + 100], reason="Anti-Nuke: duplicate spam")))
+        for aid in authors:
+            jobs.append(self._punish(guild, guild.get_member(aid), settings, f"Duplicate spam: {len(batch)} copies across {len(by_channel)} channels"))
+        for r in await asyncio.gather(*jobs, return_exceptions=True):
+            if isinstance(r, Exception) and not isinstance(r, (discord.Forbidden, discord.NotFound)):
+                log.warning(f"Duplicate spam cleanup failed in guild {guild.id}: {r!r}")
+        return True
+
+    def _compile_filters(self, settings: dict) -> list:
+        filters = []
+        if settings.get("block_invites", True):
+            filters.append(partial(self._filter_invites, settings))
+        if settings.get("block_nsfw_in_sfw_channels", True):
+            filters.append(partial(self._filter_images, settings))
+        if int(settings.get("dup_threshold", 6)) > 0:
+            filters.append(partial(self._filter_duplicates, settings, int(settings.get("dup_threshold", 6)), int(settings.get("dup_window", 30)), int(settings.get("dup_min_length", 20))))
+        filters.append(partial(self._filter_spam, settings, int(settings.get("spam_threshold", 7)), int(settings.get("spam_window", 5))))
+        return filters
+
+    async def _pipeline(self, guild_id: int) -> list:
+        entry = self._pipelines.get(guild_id)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        filters = self._compile_filters(await self.get_settings(guild_id))
+        self._pipelines[guild_id] = (time.monotonic() + CACHE_TTL, filters)
+        return filters
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         if not message.guild or message.author.bot:
             return
-        settings = await self.get_settings(message.guild.id)
+        t0 = time.perf_counter()
+        try:
+            for check in await self._pipeline(message.guild.id):
+                if await check(message):
+                    return
+        finally:
+            ANTINUKE_MESSAGE_SECONDS.observe(time.perf_counter() - t0)
 
-        if settings.get("block_invites", True) and INVITE_REGEX.search(message.content):
-            try: await message.delete()
-            except discord.Forbidden: pass
-            ch = self._log_channel(message.guild, settings)
-            if ch: await ch.send(embed=ok_embed("Invite Blocked", f"{message.author.mention} in {message.channel.mention}", requester=message.author, thumbnail_user=message.author))
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        if member.bot:
             return
+        guild = member.guild
+        settings = await self.get_settings(guild.id)
+        thr = int(settings.get("join_raid_threshold", 10))
+        if thr <= 0:
+            return
+        window = float(settings.get("join_raid_window", 10))
+        joins = self.bot.shard(guild).joins
+        wave = joins.get(guild.id)
+        if wave is None:
+            wave = joins[guild.id] = JoinWave()
+        now = time.monotonic()
+        skel = wave.add(now, member, window)
+        min_age = float(settings.get("join_raid_min_age_days", 7)) * 86400
+        cutoff = float(settings.get("join_raid_score", 0.6))
+        utcnow = discord.utils.utcnow()
+        if wave.raid_until < now:
+            if len(wave.joins) < thr:
+                return
+            # Raid starts: re-score the whole window now that name clusters are visible.
+            wave.raid_until = now + float(settings.get("join_raid_cooldown", 120))
+            FILTER_HITS.inc(filter="join_raid")
+            self._log(guild, settings, ok_embed("Join Raid Detected", f"{BOLD(str(len(wave.joins)))} joins in {BOLD(str(int(window))+'s')}. Suspicious joiners will be {'banned' if settings.get('join_raid_action') == 'ban' else 'timed out'}."), alert=True)
+            suspects = [m for _, m, sk in wave.joins if m.id not in wave.actioned and join_score(m, sk, wave.names, utcnow, min_age) >= cutoff]
+        else:
+            wave.raid_until = max(wave.raid_until, now + 10)
+            suspects = [member] if member.id not in wave.actioned and join_score(member, skel, wave.names, utcnow, min_age) >= cutoff else []
+        if not suspects:
+            return
+        wave.actioned.update(m.id for m in suspects)
+        wave.pending.extend(suspects)
+        if wave.flusher is None or wave.flusher.done():
+            wave.flusher = asyncio.ensure_future(self._flush_join_raid(guild, wave))
+
+    async def _flush_join_raid(self, guild: discord.Guild, wave: JoinWave):
+        # Actions go out in batches: up to 200 per bulk_ban, or a wave of concurrent timeouts.
+        while wave.pending:
+            if len(wave.pending) < 200:
+                await asyncio.sleep(1.0)
+            batch, wave.pending = wave.pending[:200], wave.pending[200:]
+            settings = await self.get_settings(guild.id)  # changes made mid-raid apply to the next batch
+            action = settings.get("join_raid_action", "timeout")
+            t0 = time.perf_counter()
+            done = 0
+            if action == "ban":
+                try:
+                    result = await self.bot.rest.run(LANE_CONTAINMENT, f"ban:{guild.id}", partial(guild.bulk_ban, batch, reason="Anti-Nuke: join raid", delete_message_seconds=3600))
+                    done = len(result.banned)
+                except discord.HTTPException as e:
+                    log.warning(f"Join-raid bulk ban failed in guild {guild.id}: {e!r}")
+            else:
+                until = discord.utils.utcnow() + timedelta(seconds=int(settings.get("join_raid_timeout_seconds", 600)))
+                results = await asyncio.gather(*(self.bot.rest.run(LANE_CONTAINMENT, f"member:{guild.id}", partial(m.timeout, until, reason="Anti-Nuke: join raid"))
+                                                 for m in batch), return_exceptions=True)
+                done = sum(1 for r in results if not isinstance(r, Exception))
+            PUNISH_SECONDS.observe(time.perf_counter() - t0)
+            self._log(guild, settings, ok_embed("Join Raid Contained", f"{BOLD(action.capitalize())}: {done}/{len(batch)} suspicious joiners."), alert=True)
+            await self.bot.audit(guild.id, "joinraid", None, None, f"{action} {done}/{len(batch)}")
+        if len(wave.actioned) > 20000:
+            wave.actioned.clear()
 
-        if settings.get("block_nsfw_in_sfw_channels", True) and message.attachments and not getattr(message.channel, "is_nsfw", lambda: False)():
-            is_img = any(att.content_type and att.content_type.startswith("image/") for att in message.attachments)
-            if is_img:
-                try: await message.delete()
-                except discord.Forbidden: pass
-                ch = self._log_channel(message.guild, settings)
-                if ch: await ch.send(embed=ok_embed("Image Blocked", f"{message.author.mention} in {message.channel.mention}", requester=message.author, thumbnail_user=message.author))
-
-        thr = int(settings.get("spam_threshold", 7))
-        win = int(settings.get("spam_window", 5))
-        key = (message.guild.id, message.author.id)
-        now = datetime.now(timezone.utc)
-        arr = bot.spam_cache.setdefault(key, [])
-        arr.append(now)
-        bot.spam_cache[key] = [t for t in arr if (now - t).total_seconds() <= win]
-        if len(bot.spam_cache[key]) >= thr:
-            try: await message.delete()
-            except discord.Forbidden: pass
-            await self._punish(message.guild, message.author, settings, f"Spam: {len(bot.spam_cache[key])}/{thr} in {win}s", actor=message.author)
-            bot.spam_cache[key].clear()
+    @commands.Cog.listener()
+    async def on_audit_log_entry_create(self, entry: discord.AuditLogEntry):
+        self.bot.audit_index.add(entry.guild.id, entry.action, getattr(entry.target, "id", None), entry.id, entry.user_id)
 
     @commands.Cog.listener()
     async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
         guild = channel.guild
+        since = self.bot.audit_index.since()
         settings = await self.get_settings(guild.id)
         thr = int(settings.get("channel_delete_threshold", 3))
         win = int(settings.get("channel_delete_window", 15))
         try:
-            async for entry in guild.audit_logs(limit=5, action=discord.AuditLogAction.channel_delete):
-                if entry.target.id == channel.id:
-                    actor = guild.get_member(entry.user.id)
-                    if not actor: return
-                    key = (guild.id, actor.id)
-                    now = datetime.now(timezone.utc)
-                    arr = bot.chan_del_cache.setdefault(key, [])
-                    arr.append(now)
-                    bot.chan_del_cache[key] = [t for t in arr if (now - t).total_seconds() <= win]
-                    if len(bot.chan_del_cache[key]) >= thr:
-                        g = await self.bot.db.get_guild(guild.id)
-                        wl = set(g.get("whitelist_ids", []))
-                        if actor.id not in wl:
-                            await self._punish(guild, actor, settings, f"Mass channel deletions ({len(bot.chan_del_cache[key])}/{thr} in {win}s)", actor=actor)
-                            bot.chan_del_cache[key].clear()
-                    return
+            actor_id = await self.bot.audit_index.resolve(guild, discord.AuditLogAction.channel_delete, channel.id, since)
         except discord.Forbidden:
-            pass
+            return
+        actor = guild.get_member(actor_id) if actor_id else None
+        if not actor: return
+        key = (guild.id, actor.id)
+        chan_del = self.bot.shard(guild).chan_del
+        n = chan_del.hit(key, win, cap=thr)
+        if n >= thr:
+            g = await self.bot.db.get_guild(guild.id)
+            wl = set(g.get("whitelist_ids", []))
+            if actor.id not in wl:
+                chan_del.reset(key)
+                await self._punish(guild, actor, settings, f"Mass channel deletions ({n}/{thr} in {win}s)", actor=actor)
 
     @commands.Cog.listener()
     async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
         guild = after.guild
+        since = self.bot.audit_index.since()
         settings = await self.get_settings(guild.id)
         if after.permissions.value != before.permissions.value:
             newly = discord.Permissions(after.permissions.value & ~before.permissions.value)
             if (newly.administrator or newly.manage_guild or newly.manage_roles or
                 newly.manage_channels or newly.kick_members or newly.ban_members):
                 try:
-                    async for entry in guild.audit_logs(limit=3, action=discord.AuditLogAction.role_update):
-                        if entry.target.id == after.id:
-                            actor = guild.get_member(entry.user.id)
-                            g = await self.bot.db.get_guild(guild.id)
-                            wl = set(g.get("whitelist_ids", []))
-                            if actor and actor.id not in wl:
-                                await self._punish(guild, actor, settings, f"Dangerous permission grant on role {BOLD(after.name)}", actor=actor)
-                                if settings.get("auto_revoke_dangerous_perms", True):
-                                    await after.edit(permissions=before.permissions, reason="The Studio revert dangerous perms")
-                            return
+                    actor_id = await self.bot.audit_index.resolve(guild, discord.AuditLogAction.role_update, after.id, since)
                 except discord.Forbidden:
-                    pass
+                    return
+                actor = guild.get_member(actor_id) if actor_id else None
+                g = await self.bot.db.get_guild(guild.id)
+                wl = set(g.get("whitelist_ids", []))
+                if actor and actor.id not in wl:
+                    actions = [self._punish(guild, actor, settings, f"Dangerous permission grant on role {BOLD(after.name)}", actor=actor)]
+                    if settings.get("auto_revoke_dangerous_perms", True):
+                        actions.append(self.bot.rest.run(LANE_CONTAINMENT, f"role:{guild.id}", partial(after.edit, permissions=before.permissions, reason="The Studio revert dangerous perms")))
+                    for r in await asyncio.gather(*actions, return_exceptions=True):
+                        if isinstance(r, Exception):
+                            log.warning(f"Anti-Nuke role containment failed in guild {guild.id}: {r!r}")
 
 # ---------------- Utility ----------------
 class Utility(commands.Cog):
     def __init__(self, bot: TheStudio):
         self.bot = bot
+        bot.timers.register("reminder", self._timer_reminder)
+        self._lockdown_locks = {}
 
     @commands.command(name="say")
     @commands.has_guild_permissions(manage_messages=True)
@@ -890,12 +3417,12 @@ class Utility(commands.Cog):
         msg = await ctx.send(embed=e)
         emojis = ["1️⃣","2️⃣","3️⃣","4️⃣","5️⃣","6️⃣","7️⃣","8️⃣","9️⃣","🔟"]
         for i in range(len(options)):
-            await msg.add_reaction(emojis[i])
+            await self.bot.rest.run(LANE_LOGGING, f"reaction:{msg.channel.id}", partial(msg.add_reaction, emojis[i]))
 
     @commands.command(name="purge")
     @commands.has_guild_permissions(manage_messages=True)
     async def purge(self, ctx: commands.Context, amount: int):
-        await ctx.channel.purge(limit=amount+1)
+        await self.bot.rest.run(LANE_MODERATION, f"purge:{ctx.channel.id}", partial(ctx.channel.purge, limit=amount+1), idempotent=False)
         msg = await ctx.send(embed=ok_embed("Purged", f"Deleted {BOLD(str(amount))} messages.", requester=ctx.author, thumbnail_user=ctx.author))
         await asyncio.sleep(3); await msg.delete()
 
@@ -903,34 +3430,34 @@ class Utility(commands.Cog):
     @commands.has_guild_permissions(manage_messages=True)
     async def purgeuser(self, ctx: commands.Context, member: discord.Member, amount: int=50):
         def is_user(m): return m.author.id == member.id
-        deleted = await ctx.channel.purge(limit=amount, check=is_user, before=None)
+        deleted = await self.bot.rest.run(LANE_MODERATION, f"purge:{ctx.channel.id}", partial(ctx.channel.purge, limit=amount, check=is_user, before=None), idempotent=False)
         await ctx.send(embed=ok_embed("Purged User", f"Deleted {BOLD(str(len(deleted)))} messages from {member.mention}.", requester=ctx.author, thumbnail_user=ctx.author), delete_after=3)
 
     @commands.command(name="purgecontains")
     @commands.has_guild_permissions(manage_messages=True)
     async def purgecontains(self, ctx: commands.Context, keyword: str, amount: int=100):
         def has_kw(m): return keyword.lower() in (m.content or "").lower()
-        deleted = await ctx.channel.purge(limit=amount, check=has_kw)
+        deleted = await self.bot.rest.run(LANE_MODERATION, f"purge:{ctx.channel.id}", partial(ctx.channel.purge, limit=amount, check=has_kw), idempotent=False)
         await ctx.send(embed=ok_embed("Purged Contains", f"Deleted {BOLD(str(len(deleted)))} messages containing {CODE(keyword)}.", requester=ctx.author, thumbnail_user=ctx.author), delete_after=3)
 
     @commands.command(name="purgefiles")
     @commands.has_guild_permissions(manage_messages=True)
     async def purgefiles(self, ctx: commands.Context, amount: int=100):
         def has_file(m): return any(a.size for a in m.attachments)
-        deleted = await ctx.channel.purge(limit=amount, check=has_file)
+        deleted = await self.bot.rest.run(LANE_MODERATION, f"purge:{ctx.channel.id}", partial(ctx.channel.purge, limit=amount, check=has_file), idempotent=False)
         await ctx.send(embed=ok_embed("Purged Files", f"Deleted {BOLD(str(len(deleted)))} messages with attachments.", requester=ctx.author, thumbnail_user=ctx.author), delete_after=3)
 
     @commands.command(name="purgebots")
     @commands.has_guild_permissions(manage_messages=True)
     async def purgebots(self, ctx: commands.Context, amount: int=100):
         def is_bot(m): return m.author.bot
-        deleted = await ctx.channel.purge(limit=amount, check=is_bot)
+        deleted = await self.bot.rest.run(LANE_MODERATION, f"purge:{ctx.channel.id}", partial(ctx.channel.purge, limit=amount, check=is_bot), idempotent=False)
         await ctx.send(embed=ok_embed("Purged Bots", f"Deleted {BOLD(str(len(deleted)))} bot messages.", requester=ctx.author, thumbnail_user=ctx.author), delete_after=3)
 
     @commands.command(name="slowmode")
     @commands.has_guild_permissions(manage_channels=True)
     async def slowmode(self, ctx: commands.Context, seconds: int):
-        await ctx.channel.edit(slowmode_delay=max(0, min(seconds, 21600)))
+        await self.bot.rest.run(LANE_MODERATION, f"channel:{ctx.channel.id}", partial(ctx.channel.edit, slowmode_delay=max(0, min(seconds, 21600))))
         await ctx.reply(embed=ok_embed("Slowmode", f"Set to {CODE(str(seconds)+'s')}", requester=ctx.author, thumbnail_user=ctx.author))
 
     @commands.command(name="lock")
@@ -938,7 +3465,7 @@ class Utility(commands.Cog):
     async def lock(self, ctx: commands.Context):
         ow = ctx.channel.overwrites_for(ctx.guild.default_role)
         ow.send_messages = False
-        await ctx.channel.set_permissions(ctx.guild.default_role, overwrite=ow)
+        await self.bot.rest.run(LANE_MODERATION, f"channel:{ctx.channel.id}", partial(ctx.channel.set_permissions, ctx.guild.default_role, overwrite=ow))
         await ctx.reply(embed=ok_embed("Locked", f"{ctx.channel.mention}", requester=ctx.author, thumbnail_user=ctx.author))
 
     @commands.command(name="unlock")
@@ -946,9 +3473,61 @@ class Utility(commands.Cog):
     async def unlock(self, ctx: commands.Context):
         ow = ctx.channel.overwrites_for(ctx.guild.default_role)
         ow.send_messages = None
-        await ctx.channel.set_permissions(ctx.guild.default_role, overwrite=ow)
+        await self.bot.rest.run(LANE_MODERATION, f"channel:{ctx.channel.id}", partial(ctx.channel.set_permissions, ctx.guild.default_role, overwrite=ow))
         await ctx.reply(embed=ok_embed("Unlocked", f"{ctx.channel.mention}", requester=ctx.author, thumbnail_user=ctx.author))
 
+    async def _run_lockdown(self, ctx: commands.Context, kind: str, title: str, checkpoint: dict, reason: str) -> OverwriteRollout:
+        status = await ctx.reply(embed=ok_embed(title, "Applying to all text channels…", requester=ctx.author, thumbnail_user=ctx.author))
+        async def progress(ro: OverwriteRollout, final: bool):
+            await status.edit(embed=ok_embed(title + (" — Done" if final else ""), ro.summary(), requester=ctx.author, thumbnail_user=ctx.author))
+        ro = OverwriteRollout(self.bot.db, ctx.guild, kind, ctx.guild.default_role, checkpoint=checkpoint,
+                              concurrency=6, progress=progress, reason=reason)
+        return await self.bot.start_rollout(ro)
+
+    def _lockdown_lock(self, guild_id: int) -> asyncio.Lock:
+        lock = self._lockdown_locks.get(guild_id)
+        if lock is None:
+            lock = self._lockdown_locks[guild_id] = asyncio.Lock()
+        return lock
+
+    async def _settle_rollout(self, guild_id: int, kind: str):
+        # A resumed rollout of the opposite kind may still be running after a restart.
+        running = self.bot.rollouts.get((guild_id, kind))
+        if running and not running.done():
+            await running
+
+    @commands.command(name="lockdown")
+    @commands.has_guild_permissions(manage_channels=True)
+    async def lockdown(self, ctx: commands.Context, *, reason: Optional[str]=None):
+        # Lockdown and unlockdown for a guild run one at a time; racing on the same channels would
+        # also let a finishing unlockdown delete the new lockdown's snapshot.
+        async with self._lockdown_lock(ctx.guild.id):
+            await self._settle_rollout(ctx.guild.id, "unlockdown")
+            g = await self.bot.db.get_guild(ctx.guild.id)
+            state = g.get("lockdown") or {}
+            old = state.get("snapshot", {})
+            missing = [ch for ch in ctx.guild.text_channels if str(ch.id) not in old]
+            if not state or state.get("partial") or missing:
+                # Snapshot before touching anything. A repeated lockdown keeps the entries it already has
+                # (as do channels a partial unlockdown couldn't restore) and adds channels created since.
+                snap = {**snapshot_overwrites(missing, ctx.guild.default_role), **old}
+                fresh = not state or state.get("partial")
+                await self.bot.db.update_guild(ctx.guild.id, {"lockdown": {"snapshot": snap, "at": time.time() if fresh else state.get("at"), "by": ctx.author.id if fresh else state.get("by")}})
+            await self.bot.audit(ctx.guild.id, "lockdown", ctx.author.id, None, reason)
+            await self._run_lockdown(ctx, "lockdown", "Lockdown", {}, f"Lockdown by {ctx.author}" + (f": {reason}" if reason else ""))
+
+    @commands.command(name="unlockdown")
+    @commands.has_guild_permissions(manage_channels=True)
+    async def unlockdown(self, ctx: commands.Context):
+        async with self._lockdown_lock(ctx.guild.id):
+            await self._settle_rollout(ctx.guild.id, "lockdown")
+            g = await self.bot.db.get_guild(ctx.guild.id)
+            state = g.get("lockdown")
+            if not state:
+                return await ctx.reply(embed=ok_embed("Not Locked", "This server isn’t in lockdown.", requester=ctx.author, thumbnail_user=ctx.author))
+            await self._run_lockdown(ctx, "unlockdown", "Lockdown Lifted", {"snapshot": state.get("snapshot", {})}, f"Lockdown lifted by {ctx.author}")
+            await self.bot.audit(ctx.guild.id, "unlockdown", ctx.author.id)
+
     @commands.command(name="nuke")
     @commands.has_guild_permissions(manage_channels=True)
     async def nuke(self, ctx: commands.Context):
@@ -963,21 +3542,19 @@ class Utility(commands.Cog):
     @commands.command(name="snipe")
     async def snipe(self, ctx: commands.Context):
         key = (ctx.guild.id, ctx.channel.id)
-        sn = bot.snipes.get(key)
+        sn = self.bot.shard(ctx.guild).snipes.get(key)
         if not sn:
             return await ctx.reply(embed=ok_embed("Snipe", "Nothing to snipe yet.", requester=ctx.author, thumbnail_user=ctx.author))
-        author, content, t = sn
-        await ctx.reply(embed=ok_embed(f"Sniped {author}", content or "*<no content>*", requester=ctx.author, thumbnail_user=author))
+        await ctx.reply(embed=ok_embed(f"Sniped {sn.author_name}", sn.content or "*<no content>*", requester=ctx.author, thumbnail_user=ctx.guild.get_member(sn.author_id)))
 
     @commands.command(name="editsnipe")
     async def editsnipe(self, ctx: commands.Context):
         key = (ctx.guild.id, ctx.channel.id)
-        sn = bot.editsnipes.get(key)
+        sn = self.bot.shard(ctx.guild).editsnipes.get(key)
         if not sn:
             return await ctx.reply(embed=ok_embed("Edit Snipe", "Nothing to snipe yet.", requester=ctx.author, thumbnail_user=ctx.author))
-        author, before, after, t = sn
-        desc = f"{UNDER('Before')}: {before or '*<no content>*'}\n{UNDER('After')}: {after or '*<no content>*'}"
-        await ctx.reply(embed=ok_embed(f"Edited by {author}", desc, requester=ctx.author, thumbnail_user=author))
+        desc = f"{UNDER('Before')}: {sn.content or '*<no content>*'}\n{UNDER('After')}: {sn.after or '*<no content>*'}"
+        await ctx.reply(embed=ok_embed(f"Edited by {sn.author_name}", desc, requester=ctx.author, thumbnail_user=ctx.guild.get_member(sn.author_id)))
 
     @commands.command(name="afk")
     async def afk(self, ctx: commands.Context, *, reason: str="AFK"):
@@ -987,18 +3564,21 @@ class Utility(commands.Cog):
     @commands.command(name="remindme")
     async def remindme(self, ctx: commands.Context, duration: str, *, text: str):
         secs = parse_duration(duration, 300)
+        await self.bot.timers.schedule(f"reminder:{ctx.author.id}:{ctx.message.id}", "reminder", time.time() + secs, gid=ctx.guild.id if ctx.guild else None, uid=ctx.author.id, text=text)
         await ctx.reply(embed=ok_embed("Reminder Set", f"In {BOLD(human_timedelta(timedelta(seconds=secs)))}: {text}", requester=ctx.author, thumbnail_user=ctx.author))
-        await asyncio.sleep(secs)
+
+    async def _timer_reminder(self, timer: dict):
         try:
-            await ctx.author.send(embed=ok_embed("Reminder", text, requester=ctx.author, thumbnail_user=ctx.author))
+            user = self.bot.get_user(timer["uid"]) or await self.bot.fetch_user(timer["uid"])
+            await self.bot.rest.run(LANE_LOGGING, f"dm:{user.id}", partial(user.send, embed=ok_embed("Reminder", timer["text"], requester=user, thumbnail_user=user)), idempotent=False)
         except Exception:
             pass
 
     @commands.command(name="softban")
     @commands.has_guild_permissions(ban_members=True)
     async def softban(self, ctx: commands.Context, member: discord.Member, *, reason: Optional[str]=None):
-        await member.ban(reason=reason or f"Softban by {ctx.author}", delete_message_days=1)
-        await ctx.guild.unban(member, reason="Softban unban")
+        await self.bot.rest.run(LANE_MODERATION, f"ban:{ctx.guild.id}", partial(member.ban, reason=reason or f"Softban by {ctx.author}", delete_message_days=1))
+        await self.bot.rest.run(LANE_MODERATION, f"ban:{ctx.guild.id}", partial(ctx.guild.unban, member, reason="Softban unban"))
         await ctx.reply(embed=ok_embed("Softbanned", f"{member}", requester=ctx.author, thumbnail_user=ctx.author))
 
 # ---------------- Info ----------------
@@ -1113,16 +3693,10 @@ class SetupCog(commands.Cog):
         if msg.content.lower() == "auto":
             role = discord.utils.get(ctx.guild.roles, name="Jail") or await ctx.guild.create_role(name="Jail", reason="Setup wizard")
             jail_role_id = role.id
-            for ch in ctx.guild.channels:
-                try:
-                    ow = ch.overwrites or {}
-                    ow[role] = discord.PermissionOverwrite(
-                        view_channel=False, send_messages=False, speak=False,
-                        send_messages_in_threads=False, add_reactions=False
-                    )
-                    await ch.edit(overwrites=ow)
-                except Exception:
-                    pass
+            status = await ctx.send(embed=ok_embed("Jail Overwrites", "Applying to all channels…", requester=ctx.author, thumbnail_user=ctx.author))
+            async def progress(ro: OverwriteRollout, final: bool):
+                await status.edit(embed=ok_embed("Jail Overwrites" + (" — Done" if final else ""), ro.summary(), requester=ctx.author, thumbnail_user=ctx.author))
+            await self.bot.start_rollout(OverwriteRollout(self.bot.db, ctx.guild, "jail", role, progress=progress))
             jail_ch = discord.utils.get(ctx.guild.text_channels, name="jail")
             if not jail_ch:
                 jail_ch = await ctx.guild.create_text_channel("jail", reason="Setup wizard")
@@ -1177,6 +3751,13 @@ class SetupCog(commands.Cog):
         await self.bot.db.update_guild(ctx.guild.id, {"log_channel_id": channel.id})
         await ctx.reply(embed=ok_embed("Logging Channel", f"Set to {channel.mention}", requester=ctx.author, thumbnail_user=ctx.author))
 
+    @commands.command(name="setaudit")
+    @commands.has_guild_permissions(manage_guild=True)
+    async def setaudit(self, ctx: commands.Context, max_entries: int, max_age_days: float=AUDIT_MAX_AGE_DAYS):
+        max_entries, max_age_days = max(1, max_entries), max(0.0, max_age_days)
+        await self.bot.db.update_guild(ctx.guild.id, {"audit_retention": {"max_entries": max_entries, "max_age_days": max_age_days}})
+        await ctx.reply(embed=ok_embed("Audit Retention", f"Keeping up to {BOLD(str(max_entries))} entries for {BOLD(str(max_age_days))} days.", requester=ctx.author, thumbnail_user=ctx.author))
+
     @commands.command(name="setjail")
     @commands.has_guild_permissions(manage_roles=True)
     async def setjail(self, ctx: commands.Context, role: discord.Role):
@@ -1198,7 +3779,7 @@ class SetupCog(commands.Cog):
     @commands.command(name="setantinuke")
     @commands.has_guild_permissions(manage_guild=True)
     async def setantinuke(self, ctx: commands.Context, key: str, value: str):
-        numeric = {"timeout_seconds", "channel_delete_threshold", "channel_delete_window", "spam_threshold", "spam_window"}
+        numeric = {"timeout_seconds", "channel_delete_threshold", "channel_delete_window", "spam_threshold", "spam_window", "join_raid_timeout_seconds", "dup_threshold", "dup_window", "dup_min_length"}
         boolean = {"auto_revoke_dangerous_perms", "block_invites", "block_nsfw_in_sfw_channels"}
         patch = {}
         if key in numeric:
@@ -1208,7 +3789,7 @@ class SetupCog(commands.Cog):
         else:
             return await ctx.reply(embed=ok_embed("Unknown Key", f"{CODE(key)} not recognized.", requester=ctx.author, thumbnail_user=ctx.author))
         g = await self.bot.db.get_guild(ctx.guild.id)
-        s = g.get("antinuke", {}); s.update(patch)
+        s = {**g.get("antinuke", {}), **patch}
         await self.bot.db.update_guild(ctx.guild.id, {"antinuke": s})
         await ctx.reply(embed=ok_embed("Anti-Nuke Updated", f"{CODE(key)} → {CODE(str(patch[key]))}", requester=ctx.author, thumbnail_user=ctx.author))
 
@@ -1217,7 +3798,7 @@ class SetupCog(commands.Cog):
     async def setinvites(self, ctx: commands.Context, flag: str):
         val = flag.lower() in ("on","true","1","yes","y")
         g = await self.bot.db.get_guild(ctx.guild.id)
-        s = g.get("antinuke", {}); s["block_invites"] = val
+        s = {**g.get("antinuke", {}), "block_invites": val}
         await self.bot.db.update_guild(ctx.guild.id, {"antinuke": s})
         await ctx.reply(embed=ok_embed("Invite Filter", f"Set to {CODE(str(val))}", requester=ctx.author, thumbnail_user=ctx.author))
 
@@ -1226,7 +3807,7 @@ class SetupCog(commands.Cog):
     async def setnsfwblock(self, ctx: commands.Context, flag: str):
         val = flag.lower() in ("on","true","1","yes","y")
         g = await self.bot.db.get_guild(ctx.guild.id)
-        s = g.get("antinuke", {}); s["block_nsfw_in_sfw_channels"] = val
+        s = {**g.get("antinuke", {}), "block_nsfw_in_sfw_channels": val}
         await self.bot.db.update_guild(ctx.guild.id, {"antinuke": s})
         await ctx.reply(embed=ok_embed("NSFW Image Block", f"Set to {CODE(str(val))}", requester=ctx.author, thumbnail_user=ctx.author))
 
@@ -1244,6 +3825,17 @@ class SetupCog(commands.Cog):
 
 # ---------------- Main run ----------------
 if __name__ == "__main__":
+    if "--cluster" in sys.argv:
+        arg = sys.argv[sys.argv.index("--cluster") + 1:][:1]
+        if not arg or not arg[0].isdigit() or int(arg[0]) < 1:
+            print(f"{Fore.RED if COLOR_ENABLED else ''}[The Studio] Usage: python main.py --cluster <workers>{Style.RESET_ALL if COLOR_ENABLED else ''}")
+            sys.exit(2)
+        banner()
+        try:
+            asyncio.run(run_cluster(int(arg[0])))
+        except KeyboardInterrupt:
+            print(f"{Fore.RED if COLOR_ENABLED else ''}\n[The Studio] Cluster shutting down (KeyboardInterrupt).{Style.RESET_ALL if COLOR_ENABLED else ''}")
+        sys.exit(0)
     try:
         banner()
         bot.run(TOKEN, log_handler=None)
@@ -1252,3 +3844,6 @@ if __name__ == "__main__":
     except Exception as e:
         print(f"{Fore.RED if COLOR_ENABLED else ''}[The Studio] Fatal error: {e}{Style.RESET_ALL if COLOR_ENABLED else ''}")
         raise
+    finally:
+        bot.db.flush_sync()
+        bot.db.close()
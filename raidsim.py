@@ -0,0 +1,203 @@
+# The Studio — raid simulation
+# Replays a scripted nuke/spam raid against AntiNuke on a mocked guild and reports how long
+# containment took, what got through and how many REST calls the bot made:
+#   python raidsim.py [--channels 20] [--grants 5] [--spammers 10] [--rate 10] [--latency-ms 50] [--json out.json]
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+
+import discord
+
+from bench import FakeChannel, FakeGuild, FakeHTTP, FakeMember, FakeMessage, FakeRole, fresh_bot, main
+
+class Attacker(FakeMember):
+    # Records the moment the bot's punishment lands: a timeout, or losing administrator.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.first_action = None
+        self.contained_at = None
+
+    def contained(self) -> bool:
+        return self.contained_at is not None
+
+    async def edit(self, **kwargs):
+        was_admin = self.guild_permissions.administrator
+        await super().edit(**kwargs)
+        if self.contained_at is None and (self.timed_out_until is not None or (was_admin and not self.guild_permissions.administrator)):
+            self.contained_at = asyncio.get_running_loop().time()
+
+class RaidMessage(FakeMessage):
+    async def delete(self):
+        await super().delete()
+        self.deleted = True
+
+class Raid:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.http = FakeHTTP(args.latency_ms / 1000)
+        self.tasks = []
+        self.stats = {"channel_delete": [0, 0], "admin_grant": [0, 0], "spam": [0, 0]}  # kind -> [attempted, landed]
+        self.messages = []
+        self.first_event = None
+
+    def dispatch(self, coro, delay: float = 0.0):
+        # Each gateway event runs as its own task, the way discord.py dispatches listeners.
+        async def run():
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                await coro
+            except Exception as e:
+                print(f"listener failed: {e!r}")
+        self.tasks.append(asyncio.ensure_future(run()))
+
+    def _malicious(self, attacker: Attacker, kind: str) -> bool:
+        now = asyncio.get_running_loop().time()
+        self.stats[kind][0] += 1
+        # Discord refuses actions from timed-out members and from members who lost the permission.
+        if attacker.timed_out_until is not None:
+            return False
+        if kind != "spam" and not attacker.guild_permissions.administrator:
+            return False
+        self.stats[kind][1] += 1
+        if self.first_event is None:
+            self.first_event = now
+        if attacker.first_action is None:
+            attacker.first_action = now
+        return True
+
+    async def delete_channel(self, nuker: Attacker, channel: FakeChannel):
+        if not self._malicious(nuker, "channel_delete"):
+            return
+        self.guild.remove_channel(channel)
+        entry = self.guild.log_action(discord.AuditLogAction.channel_delete, channel, nuker.id)
+        self.dispatch(self.antinuke.on_guild_channel_delete(channel))
+        self.dispatch(self.antinuke.on_audit_log_entry_create(entry), self.args.audit_delay_ms / 1000)
+
+    async def grant_admin(self, nuker: Attacker, role: FakeRole):
+        if not self._malicious(nuker, "admin_grant"):
+            return
+        before = FakeRole(self.guild, role.id, role.name, role.permissions)
+        role.permissions = discord.Permissions(role.permissions.value | discord.Permissions(administrator=True).value)
+        entry = self.guild.log_action(discord.AuditLogAction.role_update, role, nuker.id)
+        self.dispatch(self.antinuke.on_guild_role_update(before, role))
+        self.dispatch(self.antinuke.on_audit_log_entry_create(entry), self.args.audit_delay_ms / 1000)
+
+    async def spam(self, spammer: Attacker, channel: FakeChannel):
+        if not self._malicious(spammer, "spam"):
+            return
+        msg = RaidMessage(spammer, channel, self.rng.choice(("RAID", "raided lol", "@everyone get nuked")))
+        msg.deleted = False
+        self.messages.append(msg)
+        self.dispatch(self.antinuke.on_message(msg))
+
+    def script(self, nuker: Attacker, spammers: list) -> list:
+        a = self.args
+        steps = []
+        targets = list(self.guild.text_channels[1:1 + a.channels])
+        for i, ch in enumerate(targets):
+            steps.append((i / a.rate, self.delete_channel, nuker, ch))
+        for i, role in enumerate(self.grant_roles):
+            steps.append((len(targets) / a.rate / 2 + i / a.rate, self.grant_admin, nuker, role))
+        for s in spammers:
+            start = self.rng.uniform(0, 0.5)
+            for j in range(a.spam_messages):
+                steps.append((start + j / a.spam_rate, self.spam, s, self.rng.choice(self.guild.text_channels[1:])))
+        return sorted(steps, key=lambda st: st[0])
+
+    async def run(self) -> dict:
+        a = self.args
+        with tempfile.TemporaryDirectory() as workdir:
+            bot = await fresh_bot(a.backend, workdir)
+            self.antinuke = main.AntiNuke(bot)
+            bot.audit_index.wait = a.audit_wait_ms / 1000
+            self.guild = guild = FakeGuild(10**6, self.http, members=50, channels=max(a.channels + 5, 20))
+            admin = FakeRole(guild, guild.id + 50, "Admin", discord.Permissions(administrator=True))
+            guild._roles[admin.id] = admin
+            self.grant_roles = [FakeRole(guild, guild.id + 60 + i, f"role-{i}") for i in range(a.grants)]
+            guild._roles.update({r.id: r for r in self.grant_roles})
+            nuker = guild._members[guild.id * 1000 + 900] = Attacker(guild, guild.id * 1000 + 900, "nuker", [admin])
+            spammers = []
+            for i in range(a.spammers):
+                uid = guild.id * 1000 + 1000 + i
+                spammers.append(Attacker(guild, uid, f"spammer{i}", [guild.member_role]))
+                guild._members[uid] = spammers[-1]
+
+            loop = asyncio.get_running_loop()
+            t0 = loop.time()
+            for offset, action, attacker, target in self.script(nuker, spammers):
+                delay = t0 + offset - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await action(attacker, target)
+            while self.tasks:
+                pending, self.tasks = self.tasks, []
+                await asyncio.gather(*pending)
+            await bot.modlog.drain()
+            await bot.db.flush()
+
+        attackers = [nuker] + spammers
+        contain = {}
+        for at in attackers:
+            if at.first_action is not None:
+                contain[at.name] = None if at.contained_at is None else round((at.contained_at - at.first_action) * 1000, 1)
+        last = max((at.contained_at for at in attackers if at.contained_at is not None), default=None)
+        spam_live = sum(1 for m in self.messages if not m.deleted)
+        return {
+            "settings": {k: getattr(a, k) for k in ("channels", "grants", "spammers", "spam_messages", "rate", "spam_rate", "latency_ms", "audit_delay_ms", "seed")},
+            "actions": {k: {"attempted": v[0], "landed": v[1], "blocked": v[0] - v[1]} for k, v in self.stats.items()},
+            "roles_still_admin": sum(1 for r in self.grant_roles if r.permissions.administrator),
+            "spam_left_visible": spam_live,
+            "uncontained": [name for name, ms in contain.items() if ms is None],
+            "containment_ms": contain,
+            "time_to_full_containment_ms": None if last is None or self.first_event is None or any(ms is None for ms in contain.values())
+                                           else round((last - self.first_event) * 1000, 1),
+            "api_calls": dict(sorted(self.http.calls.items())),
+            "api_calls_total": self.http.total,
+        }
+
+def print_report(r: dict):
+    s = r["settings"]
+    print(f"Raid: {s['channels']} channel deletes + {s['grants']} admin grants at {s['rate']}/s, "
+          f"{s['spammers']} spammers x {s['spam_messages']} msgs at {s['spam_rate']}/s "
+          f"(REST latency {s['latency_ms']}ms, audit event delay {s['audit_delay_ms']}ms, seed {s['seed']})\n")
+    for kind, v in r["actions"].items():
+        print(f"  {kind:<15} attempted {v['attempted']:>5}   landed {v['landed']:>5}   blocked {v['blocked']:>5}")
+    print(f"\n  roles still admin after raid: {r['roles_still_admin']}")
+    print(f"  spam messages left visible:   {r['spam_left_visible']}")
+    ms = [v for v in r["containment_ms"].values() if v is not None]
+    if ms:
+        ms.sort()
+        print(f"  per-attacker containment:     min {ms[0]}ms  p50 {ms[len(ms) // 2]}ms  max {ms[-1]}ms")
+    print(f"  nuker containment:            {r['containment_ms'].get('nuker')}ms")
+    print(f"  time to full containment:     {r['time_to_full_containment_ms']}ms" + (f"  (uncontained: {', '.join(r['uncontained'])})" if r["uncontained"] else ""))
+    print(f"\n  API calls: {r['api_calls_total']}  " + "  ".join(f"{k}={v}" for k, v in r["api_calls"].items()))
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Scripted raid against AntiNuke on a mocked guild.")
+    p.add_argument("--channels", type=int, default=20, help="channels the nuker deletes")
+    p.add_argument("--grants", type=int, default=5, help="roles the nuker grants administrator to")
+    p.add_argument("--rate", type=float, default=10.0, help="nuker actions per second")
+    p.add_argument("--spammers", type=int, default=10, help="spam accounts")
+    p.add_argument("--spam-messages", type=int, default=20, help="messages per spam account")
+    p.add_argument("--spam-rate", type=float, default=5.0, help="messages per second per spam account")
+    p.add_argument("--latency-ms", type=float, default=50.0, help="simulated latency per REST call")
+    p.add_argument("--audit-delay-ms", type=float, default=100.0, help="delay before the audit-log gateway event arrives")
+    p.add_argument("--audit-wait-ms", type=float, default=1500.0, help="how long handlers wait for that event before fetching")
+    p.add_argument("--backend", choices=("json", "mongo"), default="json")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", help="write the report to this file")
+    return p.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    main.log.setLevel("WARNING")
+    report = asyncio.run(Raid(args).run())
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)